@@ -14,7 +14,7 @@ class TemporalPatternAdmin(admin.ModelAdmin):
 
 class TimeSeriesAdmin(admin.ModelAdmin):
     list_filter = ('project',)
-    list_display = [f.name for f in TimeSeries._meta.fields]
+    list_display = [f.name for f in TimeSeries._meta.fields if f.name != 'data_binary']
 
 
 admin.site.register(IDFTable, IDFTableAdmin)
@@ -1,65 +1,462 @@
+from hydrology.caching import RESPONSE_CACHE_TIMEOUT, project_cache_version, response_cache_enabled, \
+    response_cache_key
+from hydrology.columns import AGGREGATIONS, columns_to_csv, columns_to_ndjson, empty_columns, parse_frequency, \
+    parse_timestamps, resample_columns
+from hydrology.idf import idw_depths
 from hydrology.models import IDFTable, TimeSeries, TemporalPattern
+from hydrology.renderers import hydrology_renderers
 from hydrology.serializers import IDFTableSerializer, TimeSeriesSerializer, TemporalPatternSerializer
 
+import codecs
+import hashlib
 import logging
-from rest_framework import viewsets
+import math
+import zlib
+import numpy as np
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware, utc
+from django.db.models.expressions import RawSQL
+from django.shortcuts import get_object_or_404
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from gn_anuga.models import Project
 
 logger = logging.getLogger(__name__)
 
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+UPLOAD_PROGRESS_TIMEOUT = 3600
 
-class IDFTableViewSet(viewsets.ModelViewSet):
-    serializer_class = IDFTableSerializer
-    permission_classes = [IsAuthenticated]
 
-    def perform_update(self, serializer):
-        serializer.save(updated_by=self.request.user)
+NEAREST_DEFAULT = 5
+NEAREST_MAX = 50
+NEAREST_OVERFETCH = 2  # candidates fetched per table returned, see nearest_tables
+IDW_POWER = 2
 
-    def perform_create(self, serializer):
-        project_id = int(self.kwargs['project_id'])
-        project = Project.objects.get(id=project_id)
-        serializer.save(project=project, created_by=self.request.user, owner=self.request.user)
 
-    def get_queryset(self):
-        project_id = int(self.kwargs['project_id'])
-        project = Project.objects.get(id=project_id)
-        idf_tables = IDFTable.objects.filter(project=project)
-        return idf_tables
+def number_param(request, param, default=None, minimum=None, maximum=None, cast=float):
+    """Parse a numeric query parameter, raising a 400 if it is missing (with no default), malformed or out of range."""
+    value = request.query_params.get(param)
+    if value in (None, ''):
+        if default is None:
+            raise serializers.ValidationError({param: "This parameter is required."})
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        raise serializers.ValidationError({param: "Must be a number."})
+    if not math.isfinite(number):
+        raise serializers.ValidationError({param: "Must be a finite number."})
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise serializers.ValidationError({param: f"Must be between {minimum} and {maximum}."})
+    return number
 
-class TimeSeriesViewSet(viewsets.ModelViewSet):
-    serializer_class = TimeSeriesSerializer
-    permission_classes = [IsAuthenticated]
 
-    def perform_update(self, serializer):
-        serializer.save(updated_by=self.request.user)
+def number_list_param(request, param):
+    """Parse a comma-separated list of numbers, or return None if the parameter is absent."""
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    try:
+        return np.array([float(item) for item in value.split(',') if item.strip()])
+    except ValueError:
+        raise serializers.ValidationError({param: "Must be a comma-separated list of numbers."})
 
-    def perform_create(self, serializer):
-        project_id = int(self.kwargs['project_id'])
-        project = Project.objects.get(id=project_id)
-        serializer.save(project=project, created_by=self.request.user, owner=self.request.user)
 
-    def get_queryset(self):
+def time_window(request):
+    """Parse the ``?start=`` and ``?end=`` query parameters into wall-clock ``datetime64`` bounds (or None)."""
+    bounds = []
+    for param in ('start', 'end'):
+        value = request.query_params.get(param)
+        if not value:
+            bounds.append(None)
+            continue
+        timestamps, bad_indices = parse_timestamps([value])
+        if len(bad_indices):
+            raise serializers.ValidationError({param: "Must be an ISO 8601 timestamp."})
+        bounds.append(timestamps[0])
+    return tuple(bounds)
+
+
+class HydrologyCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class SummaryFilterBackend(BaseFilterBackend):
+    """
+    Filter time-series lists on their summary columns, e.g. ``?peak__gt=100&start_time__gte=2022-06-01``.
+
+    Only the parameters in ``fields`` are accepted, with an optional ``__gt``/``__gte``/``__lt``/``__lte``
+    lookup. Times without an offset are taken as UTC.
+    """
+    fields = {
+        'peak': 'peak_value',
+        'depth': 'total_depth',
+        'rows': 'row_count',
+        'step': 'step_seconds',
+        'start_time': 'start_time',
+        'end_time': 'end_time',
+    }
+    lookups = ('exact', 'gt', 'gte', 'lt', 'lte')
+
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'action', None) != 'list':
+            return queryset
+        filters = {}
+        for param, value in request.query_params.items():
+            name, _, lookup = param.partition('__')
+            if name not in self.fields or (lookup or 'exact') not in self.lookups:
+                continue
+            field = self.fields[name]
+            filters[f"{field}__{lookup or 'exact'}"] = self.parse(param, field, value)
+        return queryset.filter(**filters)
+
+    @staticmethod
+    def parse(param, field, value):
+        if field in ('start_time', 'end_time'):
+            parsed = parse_datetime(value)
+            if parsed is None and parse_date(value) is not None:
+                parsed = parse_datetime(f'{value}T00:00:00')
+            if parsed is None:
+                raise serializers.ValidationError({param: "Must be an ISO 8601 date or timestamp."})
+            return make_aware(parsed, utc) if is_naive(parsed) else parsed
+        try:
+            return int(value) if field == 'row_count' else float(value)
+        except ValueError:
+            raise serializers.ValidationError({param: "Must be a number."})
+
+
+class ProjectedListMixin:
+    """Cursor-paginated lists that skip the serializer's ``Meta.deferred_fields`` unless they are requested."""
+    pagination_class = HydrologyCursorPagination
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            deferred = self.get_serializer_class().deferred_fields(self.request)
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
+
+
+class CachedResponseMixin:
+    """
+    Serve ``list`` and ``retrieve`` from the per-project response cache, with ``ETag``/``Last-Modified`` headers.
+
+    The ETag is a hash of the rendered body (which includes each record's ``updated_at``) and Last-Modified is
+    the project's last change, so conditional requests get a 304 without re-serialising anything. The browsable
+    API is never cached, and nothing is when the cache isn't shared between processes.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'api' or not response_cache_enabled():
+            return handler(request, *args, **kwargs)
         project_id = int(self.kwargs['project_id'])
-        project = Project.objects.get(id=project_id)
-        time_series = TimeSeries.objects.filter(project=project)
-        return time_series
+        version = project_cache_version(project_id)
+        key = response_cache_key(project_id, version, request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK or not isinstance(response, Response):
+                return response
+            renderer = request.accepted_renderer
+            content = renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+            content_type = request.accepted_media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            if isinstance(content, str):
+                content = content.encode(renderer.charset or 'utf-8')
+            etag = quote_etag(hashlib.sha256(content).hexdigest())
+            cache.set(key, (content, content_type, etag), RESPONSE_CACHE_TIMEOUT)
+            response.content = content  # marks the response rendered, so it isn't rendered twice
+            response['Content-Type'] = content_type
+        else:
+            content, content_type, etag = cached
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return get_conditional_response(request._request, etag=etag, last_modified=int(version), response=response)
 
 
-class TemporalPatternViewSet(viewsets.ModelViewSet):
-    serializer_class = TemporalPatternSerializer
+def upload_progress_key(time_series_id):
+    return f'hydrology:time-series:{time_series_id}:upload'
+
+
+def accepts_gzip(request):
+    """
+    Whether the request's Accept-Encoding allows gzip, by name or through ``*``.
+
+    A coding with ``q=0`` is refused, and an explicit ``gzip`` entry overrides ``*``.
+    """
+    qualities = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0)) > 0
+
+
+def gzip_stream(chunks):
+    """Gzip an iterable of byte strings lazily, yielding compressed blocks as the compressor emits them."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class ProjectScopedViewSet(CachedResponseMixin, ProjectedListMixin, viewsets.ModelViewSet):
+    """
+    Base viewset for records that belong to the project in the URL.
+
+    The project is looked up at most once per request (and not at all when the response comes from the cache),
+    then shared by ``get_queryset`` and ``perform_create``.
+    """
     permission_classes = [IsAuthenticated]
+    renderer_classes = hydrology_renderers()
+    model = None
+    detail_select_related = ()
+
+    @cached_property
+    def project(self):
+        return get_object_or_404(Project.objects.only('id', 'name'), pk=int(self.kwargs['project_id']))
+
+    def get_queryset(self):
+        queryset = self.model.objects.filter(project=self.project)
+        if self.detail and self.detail_select_related:
+            queryset = queryset.select_related(*self.detail_select_related)
+        return queryset
 
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
     def perform_create(self, serializer):
-        project_id = int(self.kwargs['project_id'])
-        project = Project.objects.get(id=project_id)
-        serializer.save(project=project, created_by=self.request.user, owner=self.request.user)
+        serializer.save(project=self.project, created_by=self.request.user, owner=self.request.user)
 
-    def get_queryset(self):
-        project_id = int(self.kwargs['project_id'])
-        project = Project.objects.get(id=project_id)
-        temporal_patterns = TemporalPattern.objects.filter(project=project)
-        return temporal_patterns
+
+class IDFTableViewSet(ProjectScopedViewSet):
+    serializer_class = IDFTableSerializer
+    model = IDFTable
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request, *args, **kwargs):
+        """
+        The ``?k=`` IDF tables nearest ``?lon=&lat=`` (WGS84), nearest first, each with its ``distance`` in metres.
+
+        Candidates come from a KNN (``<->``) scan of the spatial index on ``location_geom``, so the lookup stays
+        fast however many tables there are. With ``?interpolate=true`` the response also has a depth grid
+        interpolated across the neighbours by inverse distance weighting, for ``?durations=`` (minutes) and
+        ``?aeps=`` (%) given as comma-separated lists, or by default the nearest table's own grid.
+        """
+        return self.cached_response(self.nearest_tables, request, *args, **kwargs)
+
+    def nearest_tables(self, request, *args, **kwargs):
+        lon = number_param(request, 'lon', minimum=-180, maximum=180)
+        lat = number_param(request, 'lat', minimum=-90, maximum=90)
+        k = number_param(request, 'k', default=NEAREST_DEFAULT, minimum=1, maximum=NEAREST_MAX, cast=int)
+        site = Point(lon, lat, srid=4326)
+        # Django has no lookup for the KNN operator; ORDER BY <-> ... LIMIT n is answered from the GiST index
+        knn = RawSQL('location_geom <-> ST_SetSRID(ST_MakePoint(%s, %s), 4326)', (lon, lat))
+        tables = list(
+            self.get_queryset().filter(location_geom__isnull=False)
+            .annotate(distance=Distance('location_geom', site))
+            .order_by(knn)[:NEAREST_OVERFETCH * k]
+        )
+        # <-> ranks by planar degrees, so re-rank the candidates by their distance on the ground and keep k. Far
+        # from the equator a table just outside the candidates can still be nearer on the ground, so the result
+        # is an approximation of the k nearest, if a close one.
+        tables.sort(key=lambda table: table.distance.m)
+        tables = tables[:k]
+        results = self.get_serializer(tables, many=True).data
+        for result, table in zip(results, tables):
+            result['distance'] = table.distance.m
+        response = {'results': results}
+        if request.query_params.get('interpolate') in ('true', '1') and tables:
+            response['interpolated'] = self.interpolate(request, tables)
+        return Response(response)
+
+    @staticmethod
+    def interpolate(request, tables):
+        nearest = tables[0].idf_matrix
+        durations = number_list_param(request, 'durations')
+        aeps = number_list_param(request, 'aeps')
+        durations = nearest.durations if durations is None else durations
+        aeps = nearest.aeps if aeps is None else aeps
+        grids = [table.interpolate_depths(durations[:, np.newaxis], aeps[np.newaxis, :]) for table in tables]
+        depths = idw_depths(grids, [table.distance.m for table in tables], IDW_POWER)
+        return {
+            'durations': durations.tolist(),
+            'aeps': aeps.tolist(),
+            'depths': [[None if np.isnan(depth) else depth for depth in row] for row in depths.tolist()],
+        }
+
+
+class TimeSeriesViewSet(ProjectScopedViewSet):
+    serializer_class = TimeSeriesSerializer
+    model = TimeSeries
+    detail_select_related = ['project']  # str() of a series, used in file names, includes the project name
+    filter_backends = [SummaryFilterBackend]
+
+    def get_renderers(self):
+        # Arrow IPC holds a single table, so it is only offered for one series at a time
+        if self.action == 'retrieve':
+            return [renderer() for renderer in hydrology_renderers(arrow=True)]
+        return super().get_renderers()
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return one series, optionally cut to ``?start=``/``?end=`` and resampled with ``?resample=15min&agg=sum``.
+
+        Windowing and resampling run on the NumPy columns; segmented series only load the segments in range.
+        """
+        params = request.query_params
+        if not any(param in params for param in ('start', 'end', 'resample')):
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(self.retrieve_window, request, *args, **kwargs)
+
+    def retrieve_window(self, request, *args, **kwargs):
+        params = request.query_params
+        start, end = time_window(request)
+        agg = params.get('agg', 'mean')
+        if agg not in AGGREGATIONS:
+            raise serializers.ValidationError({'agg': f"Must be one of {', '.join(AGGREGATIONS)}."})
+
+        instance = self.get_object()
+        timestamps, values = instance.get_columns_between(start, end)
+        if params.get('resample'):
+            try:
+                step = parse_frequency(params['resample'])
+            except ValueError as e:
+                raise serializers.ValidationError({'resample': str(e)})
+            timestamps, values = resample_columns(timestamps, values, step, agg)
+        serializer = self.get_serializer(instance, context=dict(self.get_serializer_context(), columns=(timestamps, values)))
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Stream a series as CSV (``?output=csv``, the default) or NDJSON (``?output=ndjson``), optionally limited
+        to ``?start=``/``?end=``. Rows are generated lazily in chunks, and gzipped if the client accepts it.
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            raise serializers.ValidationError({'output': f"Must be one of {', '.join(EXPORT_FORMATS)}."})
+        start, end = time_window(request)
+        time_series = self.get_object()
+        key = time_series.timestamp_key
+        content_type, extension = EXPORT_FORMATS[output]
+
+        def rows():
+            if output == 'csv':
+                yield columns_to_csv(*empty_columns(), key)
+                for timestamps, values in time_series.iter_columns_between(start, end):
+                    yield columns_to_csv(timestamps, values, key, header=False)
+            else:
+                for timestamps, values in time_series.iter_columns_between(start, end):
+                    yield columns_to_ndjson(timestamps, values, key)
+
+        chunks = rows()
+        gzipped = accepts_gzip(request)
+        if gzipped:
+            chunks = gzip_stream(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{time_series}.{extension}"'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        return response
+
+    @action(detail=True, methods=['post'])
+    def upload(self, request, *args, **kwargs):
+        """
+        Append an uploaded CSV file (multipart field ``file``) with ``timestamp,value`` columns.
+
+        The file is parsed and written in fixed-size chunks, so large gauge exports are never held in memory.
+        While it runs, ``upload-progress`` reports how many rows have been read so far.
+        """
+        time_series = get_object_or_404(self.get_queryset().defer('data', 'data_binary'), pk=kwargs['pk'])
+        self.check_object_permissions(request, time_series)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ["A CSV file is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        key = upload_progress_key(time_series.pk)
+
+        def progress(rows):
+            logger.info("Uploading %s to time series %s: %s rows appended", upload.name, time_series.pk, rows)
+            cache.set(key, {'file': upload.name, 'status': 'uploading', 'appended': rows}, UPLOAD_PROGRESS_TIMEOUT)
+        progress(0)
+        try:
+            appended = time_series.append_csv(codecs.iterdecode(upload, 'utf-8-sig'), user=request.user, progress=progress)
+        except ValidationError as e:
+            cache.set(key, {'file': upload.name, 'status': 'failed', 'appended': 0}, UPLOAD_PROGRESS_TIMEOUT)
+            return Response({'file': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        cache.set(key, {'file': upload.name, 'status': 'complete', 'appended': appended}, UPLOAD_PROGRESS_TIMEOUT)
+        return Response({'appended': appended, 'end_time': time_series.end_time})
+
+    @action(detail=True, methods=['get'], url_path='upload-progress')
+    def upload_progress(self, request, *args, **kwargs):
+        """
+        The state of the latest CSV upload to a series: ``uploading``, ``complete`` or ``failed``, with the rows
+        appended so far. Rows stay invisible to other requests until the upload completes, as it's all or nothing.
+        """
+        time_series = get_object_or_404(self.get_queryset().only('pk'), pk=kwargs['pk'])
+        self.check_object_permissions(request, time_series)
+        upload_status = cache.get(upload_progress_key(time_series.pk))
+        if upload_status is None:
+            return Response({'detail': "No upload in progress."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(upload_status)
+
+    @action(detail=True, methods=['post'])
+    def append(self, request, *args, **kwargs):
+        """Append rows to the end of a series without sending or rewriting the existing data."""
+        time_series = get_object_or_404(self.get_queryset().defer('data', 'data_binary'), pk=kwargs['pk'])
+        self.check_object_permissions(request, time_series)
+        rows = request.data.get('rowData') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            return Response({'data': ["Expected a list of rows or {'rowData': [...]}."]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            appended = time_series.append_rows(rows, user=request.user)
+        except ValidationError as e:
+            return Response({'data': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'appended': appended, 'end_time': time_series.end_time})
+
+
+class TemporalPatternViewSet(ProjectScopedViewSet):
+    serializer_class = TemporalPatternSerializer
+    model = TemporalPattern
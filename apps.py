@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class HydrologyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hydrology'
+
+    def ready(self):
+        from hydrology import signals  # noqa: F401
+        from hydrology.caching import check_response_cache
+        checks.register(check_response_cache, checks.Tags.caches)
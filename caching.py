@@ -0,0 +1,70 @@
+"""
+Per-project response caching.
+
+Every cached hydrology response is keyed on its project's cache version, the time of the project's last
+change. ``invalidate_project_cache`` moves the version on, which orphans every cached response for the project
+at once. ``hydrology.signals`` calls it whenever an IDF table, temporal pattern or time series is saved or
+deleted. Bulk writes (``update()``, ``bulk_create()``) send no signals, so their callers must call it directly.
+
+The version only reaches every process through a shared cache, so responses aren't cached at all when the default
+cache is Django's per-process ``LocMemCache``.
+"""
+import hashlib
+import time
+
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+RESPONSE_CACHE_TIMEOUT = 300
+
+
+def response_cache_enabled():
+    """True when the default cache is shared between processes, so a version bump is seen by every worker."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def check_response_cache(app_configs, **kwargs):
+    if response_cache_enabled():
+        return []
+    return [checks.Warning(
+        "Hydrology responses aren't cached, as the default cache is a per-process LocMemCache.",
+        hint="Configure a shared cache backend, such as Redis or Memcached, in CACHES['default'].",
+        id='hydrology.W001',
+    )]
+
+
+def _version_key(project_id):
+    return f'hydrology:project:{project_id}:version'
+
+
+def project_cache_version(project_id):
+    """The project's last change as a Unix timestamp, starting the clock now if it isn't known."""
+    version = cache.get(_version_key(project_id))
+    if version is None:
+        version = time.time()
+        cache.add(_version_key(project_id), version, None)
+        version = cache.get(_version_key(project_id), version)
+    return version
+
+
+def invalidate_project_cache(project_id):
+    """
+    Drop the project's cached responses now, and again once the current transaction commits.
+
+    The second bump discards anything another request cached from the database before the commit was visible.
+    """
+    if project_id is None:
+        return
+
+    def bump():
+        cache.set(_version_key(project_id), time.time(), None)
+    bump()
+    transaction.on_commit(bump)
+
+
+def response_cache_key(project_id, version, request):
+    """Cache key for a response to ``request``, which varies with its full URL (scheme and host too) and media type."""
+    variant = f'{request.scheme}://{request.get_host()}{request.get_full_path()}|{request.accepted_media_type}'
+    return f'hydrology:project:{project_id}:{version}:{hashlib.md5(variant.encode()).hexdigest()}'
@@ -0,0 +1,88 @@
+"""
+Chart rendering for time series.
+
+Charts are drawn with matplotlib's object-oriented API onto a private Agg canvas, never through
+``pyplot``. pyplot keeps every figure in a process-wide registry until it is closed, so rendering
+through it leaks memory in long-running workers, and threads that share its "current figure"
+draw onto each other's charts. Each render here owns its figure from creation to disposal.
+"""
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import date2num
+from matplotlib.figure import Figure
+
+ChartTemplate = namedtuple('ChartTemplate', ['width', 'height', 'dpi', 'color', 'xlabel', 'ylabel'])
+ChartTemplate.__new__.__defaults__ = (6.4, 4.8, 100, 'C0', None, None)
+
+TIMESERIES_CHART = ChartTemplate()
+
+# Part of every chart's content hash; bump it when a rendering change should invalidate stored charts
+RENDERER_VERSION = 2
+
+
+def new_figure(template=TIMESERIES_CHART):
+    """Create a figure from ``template`` attached to its own Agg canvas, with a single set of axes."""
+    figure = Figure(figsize=(template.width, template.height), dpi=template.dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+    if template.xlabel:
+        axes.set_xlabel(template.xlabel)
+    if template.ylabel:
+        axes.set_ylabel(template.ylabel)
+    return figure, axes
+
+
+def figure_to_png(figure):
+    """Render ``figure`` to PNG bytes and release everything it holds."""
+    buffer = BytesIO()
+    try:
+        figure.tight_layout()  # Adjust layout to prevent cut-off
+        figure.savefig(buffer, format='png')
+    finally:
+        figure.clear()
+    return buffer.getvalue()
+
+
+def pixel_width(template=TIMESERIES_CHART):
+    return int(template.width * template.dpi)
+
+
+def bucket_extremes(timestamps, values, buckets):
+    """
+    Reduce a series to its minimum and maximum in each of ``buckets`` equal time spans.
+
+    Returns ``(timestamps, lows, highs)`` where each timestamp is the first in its bucket. Empty buckets
+    are dropped and NaN values are ignored, so a bucket of only NaN reports NaN (drawn as a gap).
+    """
+    if len(values) <= buckets:
+        return timestamps, values, values
+    times = timestamps.astype(np.int64)
+    edges = np.linspace(times[0], times[-1], buckets, endpoint=False)
+    starts = np.unique(np.searchsorted(times, edges))
+    return timestamps[starts], np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)
+
+
+def render_timeseries_chart(timestamps, values, template=TIMESERIES_CHART):
+    """
+    Draw a series as bars on a date axis and return the chart as PNG bytes.
+
+    Series wider than the chart are first reduced to one min/max bar per pixel column, which draws the
+    same image as plotting every bar, so render cost is bounded by the chart width, not the series length.
+    """
+    figure, axes = new_figure(template)
+    if len(values):
+        width = pixel_width(template)
+        if len(values) <= width:
+            positions = date2num(timestamps)
+            bar_width = np.min(np.diff(positions)) if len(positions) > 1 else 1 / 24
+            axes.bar(positions, values, width=bar_width, color=template.color)
+        else:
+            starts, lows, highs = bucket_extremes(timestamps, values, width)
+            axes.vlines(date2num(starts), np.fmin(lows, 0), np.fmax(highs, 0),
+                        colors=template.color, linewidth=72 / template.dpi)
+    axes.xaxis_date()
+    figure.autofmt_xdate()
+    return figure_to_png(figure)
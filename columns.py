@@ -0,0 +1,440 @@
+"""
+Columnar representation of TimeSeries data.
+
+A series is held as two NumPy arrays: ``datetime64[us]`` wall-clock timestamps
+(in the series' timezone, as ``TimeSeries.data_with_datetimes`` treats them)
+and ``float64`` values. Packed columns are stored as a zlib-compressed blob;
+regular (fixed-step) series pack their values only.
+"""
+import csv
+import re
+import struct
+import zlib
+from itertools import islice
+from operator import itemgetter
+
+import numpy as np
+
+TIMESTAMP_KEYS = ('timestamp', 'ts')
+TIMESTAMP_DTYPE = 'datetime64[us]'
+VALUE_DTYPE = 'float64'
+
+# Offsets are dropped rather than applied: timestamps are wall-clock times in the series' timezone.
+_TIMEZONE_SUFFIX = re.compile(r'Z?(?:[+-]\d\d:?\d\d)?$')
+# NumPy also parses 'now', 'today' and bare years, and applies any other offset it finds, so what is left
+# once the suffix is stripped must be a plain 'YYYY-MM-DD[Thh:mm:ss.ffffff]'
+_ISO_TIMESTAMP = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}(?:[T ][0-9:.]*)?')
+_DATE_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+_DIGIT_BYTES = np.zeros(256, dtype=bool)
+_DIGIT_BYTES[np.frombuffer(b'0123456789', 'u1')] = True
+_SEPARATOR_BYTES = np.zeros(256, dtype=bool)
+_SEPARATOR_BYTES[np.frombuffer(b'T \0', 'u1')] = True
+_TIME_BYTES = _DIGIT_BYTES.copy()
+_TIME_BYTES[np.frombuffer(b':.\0', 'u1')] = True
+
+_FREQUENCY = re.compile(r'^(\d+)\s*(us|ms|s|sec|min|T|h|H|d|D)$')
+_FREQUENCY_UNITS = {'us': 'us', 'ms': 'ms', 's': 's', 'sec': 's', 'min': 'm', 'T': 'm', 'h': 'h', 'H': 'h', 'd': 'D', 'D': 'D'}
+AGGREGATIONS = ('sum', 'mean', 'max', 'min')
+CSV_CHUNK_SIZE = 50000
+
+_MAGIC = b'HTS1'
+_VALUES_MAGIC = b'HTV1'
+_HEADER = struct.Struct('<4sQ')
+
+
+def empty_columns():
+    return np.empty(0, dtype=TIMESTAMP_DTYPE), np.empty(0, dtype=VALUE_DTYPE)
+
+
+def timestamp_key(rows):
+    """Return the key holding the timestamp in ``rows`` ('timestamp' unless the rows use 'ts')."""
+    for row in rows[:1]:
+        for key in TIMESTAMP_KEYS:
+            if isinstance(row, dict) and key in row:
+                return key
+    return TIMESTAMP_KEYS[0]
+
+
+class TimeSeriesDataError(ValueError):
+    """Raised when rows can't be converted to columns. ``messages`` lists every problem found."""
+
+    def __init__(self, messages):
+        super().__init__(' '.join(messages))
+        self.messages = messages
+
+
+def _describe_rows(indices, row_numbers=None):
+    label = 'Row' if len(indices) == 1 else 'Rows'
+    if row_numbers is not None:
+        indices = row_numbers[indices]
+    return f"{label} {', '.join(str(index) for index in indices)}"
+
+
+def _strip_timezone_suffixes(strings):
+    """
+    Return ``strings`` as a fixed-width bytes array with any trailing 'Z' and '±HH:MM' or '±HHMM' offset removed.
+
+    Works on a 2-D byte view of the array so no per-string Python code runs.
+    """
+    raw = np.array(strings, dtype='S')
+    width = raw.dtype.itemsize
+    if not len(raw) or not width:
+        return raw
+    chars = raw.view('u1').reshape(len(raw), width)
+    lengths = np.char.str_len(raw)
+    rows = np.arange(len(raw))
+
+    def char_at(ends, offset):
+        position = ends + offset
+        return np.where(position >= 0, chars[rows, np.clip(position, 0, width - 1)], 0)
+
+    def is_digit(ends, offset):
+        char = char_at(ends, offset)
+        return (char >= ord('0')) & (char <= ord('9'))
+
+    signs = (ord('+'), ord('-'))
+    digits = is_digit(lengths, -1) & is_digit(lengths, -2)
+    has_offset = digits & np.isin(char_at(lengths, -6), signs) & (char_at(lengths, -3) == ord(':')) \
+        & is_digit(lengths, -4) & is_digit(lengths, -5)
+    has_short_offset = digits & np.isin(char_at(lengths, -5), signs) & is_digit(lengths, -3) & is_digit(lengths, -4)
+    ends = np.where(has_offset, lengths - 6, np.where(has_short_offset, lengths - 5, lengths))
+    ends = ends - (char_at(ends, -1) == ord('Z'))
+    truncated = np.flatnonzero(ends < lengths)
+    if len(truncated):
+        suffixed = chars[truncated]
+        suffixed[np.arange(width) >= ends[truncated, None]] = 0
+        chars[truncated] = suffixed
+    return raw
+
+
+def _is_iso_shaped(raw):
+    """True for each entry of a fixed-width bytes array shaped like 'YYYY-MM-DD[Thh:mm:ss.ffffff]'."""
+    width = raw.dtype.itemsize
+    if width < 10:
+        return np.zeros(len(raw), dtype=bool)
+    chars = raw.view('u1').reshape(len(raw), width)
+    shaped = _DIGIT_BYTES[chars[:, _DATE_DIGITS]].all(axis=1) & (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-'))
+    if width > 10:
+        shaped &= _SEPARATOR_BYTES[chars[:, 10]] & _TIME_BYTES[chars[:, 11:]].all(axis=1)
+    return shaped
+
+
+def parse_timestamps(strings):
+    """
+    Parse ISO 8601 strings into a ``datetime64[us]`` array in one vectorised pass.
+
+    A trailing 'Z' or UTC offset is dropped; anything else but a 'YYYY-MM-DD' date and optional time is bad.
+    Returns ``(timestamps, bad_indices)``; unparseable entries are NaT and listed in ``bad_indices``.
+    """
+    timestamps = None
+    if set(map(type, strings)) <= {str}:
+        try:
+            raw = _strip_timezone_suffixes(strings)
+            if _is_iso_shaped(raw).all():
+                timestamps = raw.astype(TIMESTAMP_DTYPE)
+        except (UnicodeEncodeError, ValueError):
+            pass
+
+    if timestamps is None:
+        # Only reached when something is invalid: find every bad row rather than the first
+        timestamps = np.full(len(strings), np.datetime64('NaT'), dtype=TIMESTAMP_DTYPE)
+        for index, string in enumerate(strings):
+            try:
+                string = _TIMEZONE_SUFFIX.sub('', string)
+                if _ISO_TIMESTAMP.fullmatch(string):
+                    timestamps[index] = np.datetime64(string, 'us')
+            except (TypeError, ValueError):
+                pass
+    return timestamps, np.flatnonzero(np.isnat(timestamps))
+
+
+def parse_values(values):
+    """
+    Convert values to ``float64``; returns ``(values, bad_indices)`` with NaN at bad entries.
+
+    Missing (None) and non-finite values are bad, as they can't be written to JSON.
+    """
+    bad_indices = []
+    try:
+        parsed = np.array(values, dtype=VALUE_DTYPE)
+    except (TypeError, ValueError):
+        parsed = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                parsed[index] = value
+            except (TypeError, ValueError):
+                bad_indices.append(index)
+    non_finite = ~np.isfinite(parsed)
+    if non_finite.any():
+        parsed[non_finite] = np.nan
+        bad_indices = np.union1d(bad_indices, np.flatnonzero(non_finite))
+    return parsed, np.asarray(bad_indices, dtype=int)
+
+
+def validate_columns(timestamps, bad_timestamps=(), bad_values=(), row_numbers=None):
+    """
+    Return error messages for unparseable rows and for timestamps that repeat or go backwards.
+
+    Rows are described by index, or by the matching entry of ``row_numbers`` when it is given.
+    """
+    messages = []
+    if len(bad_timestamps):
+        messages.append(f"{_describe_rows(bad_timestamps, row_numbers)}: timestamps must be in ISO 8601 format.")
+    if len(bad_values):
+        messages.append(f"{_describe_rows(bad_values, row_numbers)}: values must be numeric.")
+    valid = np.flatnonzero(~np.isnat(timestamps))
+    steps = np.diff(timestamps[valid])
+    duplicates = valid[1:][steps == np.timedelta64(0)]
+    backwards = valid[1:][steps < np.timedelta64(0)]
+    if len(duplicates):
+        messages.append(f"{_describe_rows(duplicates, row_numbers)}: duplicate timestamps.")
+    if len(backwards):
+        messages.append(f"{_describe_rows(backwards, row_numbers)}: timestamps must be in increasing order.")
+    return messages
+
+
+def rows_to_columns(rows):
+    """
+    Convert a list of ``{'timestamp'|'ts', 'value'}`` dicts to ``(timestamps, values)`` arrays.
+
+    Raises ``TimeSeriesDataError`` listing every bad row.
+    """
+    if not rows:
+        return empty_columns()
+    key = timestamp_key(rows)
+    try:
+        timestamp_strings = list(map(itemgetter(key), rows))
+        values = list(map(itemgetter('value'), rows))
+    except (KeyError, TypeError):
+        missing = [index for index, row in enumerate(rows) if not isinstance(row, dict) or not {key, 'value'} <= row.keys()]
+        raise TimeSeriesDataError([f"{_describe_rows(missing)}: the {set((key, 'value'))} fields are required in each data point."])
+
+    timestamps, bad_timestamps = parse_timestamps(timestamp_strings)
+    values, bad_values = parse_values(values)
+    messages = validate_columns(timestamps, bad_timestamps, bad_values)
+    if messages:
+        raise TimeSeriesDataError(messages)
+    return timestamps, values
+
+
+def read_csv_columns(lines, chunk_size=CSV_CHUNK_SIZE):
+    """
+    Parse CSV text lines into ``(timestamps, values, messages)`` chunks of at most ``chunk_size`` rows.
+
+    The header must name a ``timestamp`` (or ``ts``) column and a ``value`` column; other columns are ignored.
+    Each chunk is parsed with the vectorised parsers and ``messages`` describes its bad rows by file line
+    number, so only one chunk is held in memory at a time. Blank lines are skipped.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip() for name in next(reader, [])]
+    key = next((key for key in TIMESTAMP_KEYS if key in header), None)
+    if key is None or 'value' not in header:
+        raise TimeSeriesDataError(["The CSV header must include a 'timestamp' (or 'ts') column and a 'value' column."])
+    columns = itemgetter(header.index(key), header.index('value'))
+    width = max(header.index(key), header.index('value')) + 1
+
+    while True:
+        first_line = reader.line_num + 1
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            return
+        row_numbers = first_line + np.flatnonzero([bool(row) for row in rows])
+        rows = [row for row in rows if row]
+        messages = []
+        short = [index for index, row in enumerate(rows) if len(row) < width]
+        if short:
+            messages.append(f"{_describe_rows(short, row_numbers)}: missing the {key} or value column.")
+            rows = [row if len(row) >= width else [''] * width for row in rows]
+        timestamp_strings, values = zip(*map(columns, rows)) if rows else ((), ())
+        timestamps, bad_timestamps = parse_timestamps(list(timestamp_strings))
+        values, bad_values = parse_values([value.strip() for value in values])
+        bad_timestamps = np.setdiff1d(bad_timestamps, short)
+        bad_values = np.setdiff1d(bad_values, short)
+        messages.extend(validate_columns(timestamps, bad_timestamps, bad_values, row_numbers))
+        yield timestamps, values, messages
+
+
+def summarise_values(values):
+    """Return the ``(total, peak)`` of ``values`` ignoring NaN; both are None when there is no number."""
+    valid = values[~np.isnan(values)]
+    if not len(valid):
+        return None, None
+    return float(valid.sum()), float(valid.max())
+
+
+def merge_summaries(first, second):
+    """Combine two ``(total, peak)`` summaries, where None means the part had no numbers."""
+    totals = [total for total in (first[0], second[0]) if total is not None]
+    peaks = [peak for peak in (first[1], second[1]) if peak is not None]
+    return (sum(totals) if totals else None), (max(peaks) if peaks else None)
+
+
+def concatenate_columns(columns):
+    """Join a list of ``(timestamps, values)`` pairs into one pair."""
+    if not columns:
+        return empty_columns()
+    if len(columns) == 1:
+        return columns[0]
+    return (
+        np.concatenate([timestamps for timestamps, values in columns]),
+        np.concatenate([values for timestamps, values in columns]),
+    )
+
+
+def parse_frequency(frequency):
+    """Parse a resampling frequency such as '15min', '1h' or '30s' into a ``timedelta64``."""
+    match = _FREQUENCY.match(str(frequency).strip())
+    if not match or not int(match.group(1)):
+        raise ValueError(f"Unrecognised frequency '{frequency}'. Use e.g. '30s', '15min', '1h' or '1d'.")
+    return np.timedelta64(int(match.group(1)), _FREQUENCY_UNITS[match.group(2)]).astype('timedelta64[us]')
+
+
+def resample_columns(timestamps, values, step, agg='mean'):
+    """
+    Aggregate increasing ``timestamps`` into bins of width ``step`` aligned to the epoch.
+
+    Each bin is labelled by its start. NaN values are ignored, and bins without any numbers are omitted, so
+    the result never holds NaN.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unrecognised aggregation '{agg}'. Use one of {', '.join(AGGREGATIONS)}.")
+    if not len(timestamps):
+        return empty_columns()
+    step_us = np.timedelta64(step, 'us').astype('int64')
+    bins = timestamps.astype('int64') // step_us
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+    labels = (bins[starts] * step_us).astype(TIMESTAMP_DTYPE)
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid, starts)
+    if agg == 'max':
+        aggregated = np.fmax.reduceat(values, starts)
+    elif agg == 'min':
+        aggregated = np.fmin.reduceat(values, starts)
+    else:
+        aggregated = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        if agg == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                aggregated = aggregated / counts
+    filled = counts > 0
+    if filled.all():
+        return labels, aggregated
+    return labels[filled], aggregated[filled]
+
+
+def timestamps_to_strings(timestamps):
+    """Format timestamps as ISO 8601 strings, dropping microseconds when none are set."""
+    if not len(timestamps):
+        return []
+    whole_seconds = not np.any(timestamps.astype('int64') % 1_000_000)
+    return np.datetime_as_string(timestamps, unit='s' if whole_seconds else 'us').tolist()
+
+
+def columns_to_rows(timestamps, values, key=TIMESTAMP_KEYS[0]):
+    """Build the ag-Grid ``rowData`` list for a pair of columns."""
+    return [
+        {key: timestamp, 'value': value}
+        for timestamp, value in zip(timestamps_to_strings(timestamps), values.tolist())
+    ]
+
+
+def clip_columns(timestamps, values, start=None, end=None):
+    """Cut sorted columns to the rows between ``start`` and ``end`` inclusive; either bound may be None."""
+    first = np.searchsorted(timestamps, np.datetime64(start, 'us')) if start is not None else 0
+    last = np.searchsorted(timestamps, np.datetime64(end, 'us'), side='right') if end is not None else len(timestamps)
+    return timestamps[first:last], values[first:last]
+
+
+def columns_to_csv(timestamps, values, key=TIMESTAMP_KEYS[0], header=True):
+    """Write a pair of columns as CSV bytes, with a ``<key>,value`` header row unless ``header`` is False."""
+    lines = [f'{key},value'] if header else []
+    lines.extend(map(','.join, zip(timestamps_to_strings(timestamps), values.astype(str).tolist())))
+    return ('\n'.join(lines) + '\n').encode() if lines else b''
+
+
+def columns_to_ndjson(timestamps, values, key=TIMESTAMP_KEYS[0]):
+    """Write a pair of columns as newline-delimited JSON bytes, one ``{key: ..., "value": ...}`` object per row."""
+    if not len(timestamps):
+        return b''
+    numbers = np.where(np.isfinite(values), values.astype(str), 'null')  # JSON has no NaN or Infinity
+    lines = [
+        f'{{"{key}": "{timestamp}", "value": {number}}}'
+        for timestamp, number in zip(timestamps_to_strings(timestamps), numbers.tolist())
+    ]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def pack_columns(timestamps, values):
+    """Pack timestamps and values into a compressed blob of little-endian int64/float64 arrays."""
+    if len(timestamps) != len(values):
+        raise ValueError("Timestamps and values must be the same length.")
+    payload = b''.join([
+        _HEADER.pack(_MAGIC, len(values)),
+        np.ascontiguousarray(timestamps, dtype=TIMESTAMP_DTYPE).astype('<i8').tobytes(),
+        np.ascontiguousarray(values, dtype=VALUE_DTYPE).astype('<f8').tobytes(),
+    ])
+    return zlib.compress(payload, 1)
+
+
+def pack_values(values):
+    """Pack a values array on its own, for series whose timestamps are implied by a start and step."""
+    values = np.ascontiguousarray(values, dtype=VALUE_DTYPE)
+    return zlib.compress(_HEADER.pack(_VALUES_MAGIC, len(values)) + values.astype('<f8').tobytes(), 1)
+
+
+def is_values_only(blob):
+    """True if ``blob`` was written by ``pack_values`` rather than ``pack_columns``."""
+    return zlib.decompressobj().decompress(blob, len(_VALUES_MAGIC)) == _VALUES_MAGIC
+
+
+def _unpack_frame(payload):
+    magic, count = _HEADER.unpack_from(payload)
+    offset = _HEADER.size
+    if magic == _VALUES_MAGIC:
+        return None, np.frombuffer(payload, dtype='<f8', count=count, offset=offset)
+    if magic != _MAGIC:
+        raise ValueError("Unrecognised packed time series data.")
+    timestamps = np.frombuffer(payload, dtype='<i8', count=count, offset=offset).view(TIMESTAMP_DTYPE)
+    values = np.frombuffer(payload, dtype='<f8', count=count, offset=offset + 8 * count)
+    return timestamps, values
+
+
+def unpack_columns(blob):
+    """
+    Inverse of ``pack_columns`` and ``pack_values``.
+
+    A blob may be several packed frames concatenated together, which is how rows are appended without
+    rewriting what is already stored. Returns ``(timestamps, values)``; ``timestamps`` is None for
+    values-only blobs. Single-frame results are read-only views of the blob.
+    """
+    frames = []
+    remaining = bytes(blob)
+    while remaining:
+        decompressor = zlib.decompressobj()
+        frames.append(_unpack_frame(decompressor.decompress(remaining)))
+        remaining = decompressor.unused_data
+    if not frames:
+        raise ValueError("Unrecognised packed time series data.")
+    if len(frames) == 1:
+        return frames[0]
+    if len({timestamps is None for timestamps, values in frames}) > 1:
+        raise ValueError("Packed time series data mixes regular and irregular frames.")
+    values = np.concatenate([frame_values for frame_timestamps, frame_values in frames])
+    if frames[0][0] is None:
+        return None, values
+    return np.concatenate([frame_timestamps for frame_timestamps, frame_values in frames]), values
+
+
+def regular_timestamps(start, step_seconds, count):
+    """Synthesise ``count`` timestamps from ``start`` (a naive datetime) at a fixed step."""
+    step = np.timedelta64(int(round((step_seconds or 0) * 1_000_000)), 'us')
+    return np.datetime64(start, 'us') + np.arange(count) * step
+
+
+def detect_regular_step(timestamps):
+    """Return the step in seconds if ``timestamps`` are equally spaced and increasing, else None."""
+    if len(timestamps) < 2:
+        return None
+    steps = np.diff(timestamps.astype('int64'))
+    if steps[0] <= 0 or np.any(steps != steps[0]):
+        return None
+    return steps[0] / 1_000_000
@@ -0,0 +1,168 @@
+"""
+Matrix representation of IDFTable data.
+
+``IDFTable.data`` holds the grid the way the frontend edits it: ag-Grid ``columnDefs`` (one per frequency,
+carrying its ARI in years) and ``rowData`` dicts keyed by field names such as ``"0-5yrARI"``. ``compile_idf``
+parses that once into NumPy arrays: a durations vector (minutes), ARI and AEP vectors (years, percent) and a
+depth matrix with one row per duration and one column per frequency. Blank cells are NaN.
+"""
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# ``rows`` maps each duration back to its row in ``rowData``
+IDFMatrix = namedtuple('IDFMatrix', ['durations', 'aris', 'aeps', 'depths', 'fields', 'rows'])
+
+DURATION_FIELD = 'duration'
+# Field names encode the ARI with '-' for the decimal point, e.g. "0-5yrARI" is 0.5 years
+_ARI_FIELD = re.compile(r'^(\d+(?:-\d+)?)yrARI$')
+
+
+def aeps_from_aris(aris):
+    """Annual exceedance probabilities (%) for average recurrence intervals (years)."""
+    return 100 * -np.expm1(-1 / np.asarray(aris, dtype=float))
+
+
+def aris_from_aeps(aeps):
+    """Average recurrence intervals (years) for annual exceedance probabilities (%)."""
+    return -1 / np.log1p(-np.asarray(aeps, dtype=float) / 100)
+
+
+def _column_ari(column):
+    if column.get('ari') is not None:
+        return float(column['ari'])
+    if column.get('aep') is not None:
+        return float(aris_from_aeps(float(column['aep'])))
+    match = _ARI_FIELD.match(str(column.get('field', '')))
+    if match:
+        return float(match.group(1).replace('-', '.'))
+    return None
+
+
+def _cell(value):
+    if value is None or value == '':
+        return np.nan
+    return float(value)
+
+
+def compile_idf(data):
+    """
+    Parse ``IDFTable.data`` into an ``IDFMatrix``, with the durations in ascending order.
+
+    Raises ValueError when the grid isn't a list of rows keyed by the column fields, or a cell isn't a number.
+    """
+    data = data or {}
+    if not isinstance(data, dict):
+        raise ValueError("IDF data must be an object with 'columnDefs' and 'rowData'.")
+    column_defs = data.get('columnDefs') or []
+    rows = data.get('rowData') or []
+    if not isinstance(column_defs, list) or not isinstance(rows, list):
+        raise ValueError("IDF 'columnDefs' and 'rowData' must be lists.")
+
+    fields, aris = [], []
+    for column in column_defs:
+        if not isinstance(column, dict) or column.get('field') == DURATION_FIELD:
+            continue
+        ari = _column_ari(column)
+        if ari is not None:
+            fields.append(column['field'])
+            aris.append(ari)
+
+    durations = np.empty(len(rows))
+    depths = np.empty((len(rows), len(fields)))
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict) or row.get(DURATION_FIELD) in (None, ''):
+            raise ValueError(f"IDF row {i + 1} must be an object with a '{DURATION_FIELD}'.")
+        try:
+            durations[i] = float(row[DURATION_FIELD])
+            depths[i] = [_cell(row.get(field)) for field in fields]
+        except (TypeError, ValueError):
+            raise ValueError(f"IDF row {i + 1} has a duration or depth that isn't a number.")
+
+    order = np.argsort(durations, kind='stable')
+    aris = np.array(aris, dtype=float)
+    matrix = IDFMatrix(durations[order], aris, aeps_from_aris(aris), depths[order], tuple(fields), order)
+    for array in matrix:
+        if isinstance(array, np.ndarray):
+            array.setflags(write=False)
+    return matrix
+
+
+def data_with_depths(data, matrix, depths):
+    """
+    A copy of ``IDFTable.data`` with the depth cells replaced by ``depths``, laid out like ``matrix.depths``.
+
+    Blank cells stay blank. Other columns and row keys are kept as they are.
+    """
+    rows = [dict(row) for row in data.get('rowData') or []]
+    for position, index in enumerate(matrix.rows.tolist()):
+        for j, field in enumerate(matrix.fields):
+            if not np.isnan(depths[position, j]):
+                rows[index][field] = float(depths[position, j])
+    return dict(data, rowData=rows)
+
+
+def _bracket(grid, x):
+    """Index of the grid interval holding each ``x``, the fraction of the way along it, and whether it's inside."""
+    if len(grid) == 1:
+        zeros = np.zeros(x.shape, dtype=int)
+        return zeros, np.zeros(x.shape), x == grid[0]
+    lower = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, len(grid) - 2)
+    fraction = (x - grid[lower]) / (grid[lower + 1] - grid[lower])
+    return lower, fraction, (x >= grid[0]) & (x <= grid[-1])
+
+
+def interpolate_depths(matrix, durations, aeps):
+    """
+    Interpolate depths for any durations (minutes) and AEPs (%), which broadcast against each other.
+
+    Interpolation is bilinear in log(depth) over log(duration) and log(ARI), so it is exact for depths that
+    follow a power law in both. Points outside the grid, or next to blank or zero cells, give NaN.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        durations = np.log(np.asarray(durations, dtype=float))
+        aris = np.log(aris_from_aeps(aeps))
+    durations, aris = np.broadcast_arrays(durations, aris)
+    if not matrix.depths.size:
+        return np.full(durations.shape, np.nan)
+
+    columns = np.argsort(matrix.aris, kind='stable')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_depths = np.log(matrix.depths[:, columns])
+    log_depths[~np.isfinite(log_depths)] = np.nan
+
+    row, t, row_inside = _bracket(np.log(matrix.durations), durations)
+    column, u, column_inside = _bracket(np.log(matrix.aris[columns]), aris)
+    next_row = np.minimum(row + 1, len(matrix.durations) - 1)
+    next_column = np.minimum(column + 1, len(columns) - 1)
+    log_depth = np.zeros(durations.shape)
+    for i, j, weight in (
+        (row, column, (1 - t) * (1 - u)),
+        (next_row, column, t * (1 - u)),
+        (row, next_column, (1 - t) * u),
+        (next_row, next_column, t * u),
+    ):
+        # A corner with no weight (an exact grid line) mustn't spread a blank neighbour's NaN
+        log_depth += np.where(weight > 0, weight * log_depths[i, j], 0)
+    return np.where(row_inside & column_inside, np.exp(log_depth), np.nan)
+
+
+def idw_depths(grids, distances, power=2):
+    """
+    Inverse-distance-weighted mean of depth grids stacked on the first axis, one per distance.
+
+    Blank (NaN) cells are left out of each cell's mean, and a cell blank in every grid stays NaN. A grid at
+    distance zero is returned as it is.
+    """
+    grids = np.asarray(grids, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    exact = np.flatnonzero(distances == 0)
+    if len(exact):
+        return grids[exact[0]]
+    weights = (distances ** -power).reshape((-1,) + (1,) * (grids.ndim - 1))
+    present = ~np.isnan(grids)
+    total_weight = np.where(present, weights, 0).sum(axis=0)
+    weighted = np.where(present, weights * np.nan_to_num(grids), 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total_weight > 0, weighted / total_weight, np.nan)
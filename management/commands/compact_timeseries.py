@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hydrology.caching import invalidate_project_cache
+from hydrology.models import TimeSeries, TimeSeriesSegment
+
+
+class Command(BaseCommand):
+    help = "Convert equally spaced time series to the regular (start, step, values) storage format."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help="Only compact time series in this project.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be converted without saving.")
+
+    def handle(self, *args, **options):
+        time_series = TimeSeries.objects.exclude(storage_format=TimeSeries.REGULAR)
+        if options['project']:
+            time_series = time_series.filter(project_id=options['project'])
+
+        converted = 0
+        for series in time_series.iterator(chunk_size=100):
+            try:
+                if not series.compact_regular():
+                    continue
+            except ValueError as e:
+                self.stderr.write(f"Skipping {series}: {e}")
+                continue
+            converted += 1
+            if not options['dry_run']:
+                # The plotted data is unchanged, so skip save() and its full_clean() and chart re-queue. That
+                # also skips save()'s segment cleanup, so a segmented series' segments are deleted here.
+                with transaction.atomic():
+                    TimeSeries.objects.filter(pk=series.pk).update(
+                        storage_format=series.storage_format,
+                        data=series.data,
+                        data_binary=series.data_binary,
+                        start_time=series.start_time,
+                        step_seconds=series.step_seconds,
+                    )
+                    TimeSeriesSegment.objects.filter(timeseries_id=series.pk).delete()
+                invalidate_project_cache(series.project_id)
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} time series to regular storage."))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hydrology.tasks import render_pending_charts, requeue_interrupted_charts
+
+
+class Command(BaseCommand):
+    help = "Render pending time series charts from the database-backed queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--batch', type=int, default=50, help="Charts to render between queue checks.")
+
+    def handle(self, *args, **options):
+        requeued = requeue_interrupted_charts()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} interrupted charts.")
+        while True:
+            rendered = render_pending_charts(limit=options['batch'])
+            if rendered:
+                self.stdout.write(f"Rendered {rendered} charts.")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
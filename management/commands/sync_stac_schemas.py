@@ -0,0 +1,40 @@
+import json
+from urllib.request import urlopen
+
+import pystac
+from jsonschema_specifications import REGISTRY as METASCHEMAS
+from django.core.management.base import BaseCommand
+from pystac.validation.schema_uri_map import DefaultSchemaUriMap
+
+from hydrology.stac import BUNDLED_SCHEMAS, save_schema, schema_dir, schema_references
+
+
+class Command(BaseCommand):
+    help = "Download STAC JSON schemas, and every schema they reference, into the local schema registry."
+
+    def add_arguments(self, parser):
+        parser.add_argument('uris', nargs='*', help="Additional schema URIs to fetch, such as STAC extension schemas.")
+        parser.add_argument('--stac-version', default=pystac.get_stac_version(), help="STAC version of the core schemas.")
+
+    def handle(self, *args, **options):
+        schema_uri_map = DefaultSchemaUriMap()
+        pending = [schema_uri_map.get_object_schema_uri(object_type, options['stac_version'])
+                   for object_type in pystac.STACObjectType]
+        pending = [uri for uri in pending if uri] + options['uris']
+
+        seen = set()
+        fetched = 0
+        while pending:
+            uri = pending.pop()
+            if uri in seen or uri in METASCHEMAS:
+                continue
+            seen.add(uri)
+            if uri in BUNDLED_SCHEMAS:
+                schema = BUNDLED_SCHEMAS[uri]
+            else:
+                with urlopen(uri, timeout=30) as response:
+                    schema = json.load(response)
+                save_schema(uri, schema)
+                fetched += 1
+            pending.extend(schema_references(uri, schema))
+        self.stdout.write(self.style.SUCCESS(f"Saved {fetched} STAC schemas to {schema_dir()}."))
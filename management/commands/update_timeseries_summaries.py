@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from hydrology.caching import invalidate_project_cache
+from hydrology.models import TimeSeries
+
+
+class Command(BaseCommand):
+    help = "Compute the summary columns (row count, total depth, peak value, ...) of time series that lack them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help="Only update time series in this project.")
+        parser.add_argument('--all', action='store_true', help="Recompute every summary, not only missing ones.")
+
+    def handle(self, *args, **options):
+        time_series = TimeSeries.objects.all()
+        if not options['all']:
+            time_series = time_series.filter(row_count__isnull=True)
+        if options['project']:
+            time_series = time_series.filter(project_id=options['project'])
+
+        updated = 0
+        for series in time_series.iterator(chunk_size=100):
+            series.update_summary()
+            # The rows are unchanged, so skip save() and its full_clean() and chart re-queue.
+            TimeSeries.objects.filter(pk=series.pk).update(
+                **{field: getattr(series, field) for field in TimeSeries.SUMMARY_FIELDS}
+            )
+            invalidate_project_cache(series.project_id)
+            updated += 1
+        self.stdout.write(self.style.SUCCESS(f"Updated the summary of {updated} time series."))
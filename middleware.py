@@ -0,0 +1,42 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """A database execute wrapper that counts the queries run through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryCountMiddleware:
+    """
+    Count the database queries made while handling each request and report them in an ``X-Query-Count`` header.
+
+    Requests that go over ``HYDROLOGY_QUERY_BUDGET`` queries (if set) are logged as warnings. Queries made while
+    a streaming response is being consumed happen after the middleware returns and aren't counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budget = getattr(settings, 'HYDROLOGY_QUERY_BUDGET', None)
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(counter.count)
+        if self.budget is not None and counter.count > self.budget:
+            logger.warning(f"{request.method} {request.path} made {counter.count} queries (budget {self.budget})")
+        return response
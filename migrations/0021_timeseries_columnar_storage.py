@@ -0,0 +1,23 @@
+# Generated by Django 3.2.20 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0020_alter_idftable_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseries',
+            name='storage_format',
+            field=models.CharField(choices=[('json', 'JSON rows'), ('columnar', 'Packed columns')], default='json', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='data_binary',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
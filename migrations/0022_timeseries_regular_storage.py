@@ -0,0 +1,28 @@
+# Generated by Django 3.2.20 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0021_timeseries_columnar_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timeseries',
+            name='storage_format',
+            field=models.CharField(choices=[('json', 'JSON rows'), ('columnar', 'Packed columns'), ('regular', 'Regular interval')], default='json', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='start_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Start time'),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='step_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='Step (seconds)'),
+        ),
+    ]
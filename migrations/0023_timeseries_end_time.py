@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0022_timeseries_regular_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseries',
+            name='end_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='End time'),
+        ),
+    ]
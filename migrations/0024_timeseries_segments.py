@@ -0,0 +1,37 @@
+# Generated by Django 3.2.20 on 2026-10-18 12:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0023_timeseries_end_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timeseries',
+            name='storage_format',
+            field=models.CharField(choices=[('json', 'JSON rows'), ('columnar', 'Packed columns'), ('regular', 'Regular interval'), ('segmented', 'Chunked segments')], default='json', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='TimeSeriesSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField(verbose_name='Start time')),
+                ('end_time', models.DateTimeField(verbose_name='End time')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('data_binary', models.BinaryField()),
+                ('timeseries', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='hydrology.timeseries')),
+            ],
+            options={
+                'ordering': ['timeseries', 'start_time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timeseriessegment',
+            index=models.Index(fields=['timeseries', 'start_time', 'end_time'], name='hydrology_segment_range_idx'),
+        ),
+    ]
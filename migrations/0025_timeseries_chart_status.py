@@ -0,0 +1,24 @@
+# Generated by Django 3.2.20 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+def mark_existing_charts_ready(apps, schema_editor):
+    TimeSeries = apps.get_model('hydrology', 'TimeSeries')
+    TimeSeries.objects.exclude(chart__isnull=True).exclude(chart='').update(chart_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0024_timeseries_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseries',
+            name='chart_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_charts_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0025_timeseries_chart_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseries',
+            name='chart_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0026_timeseries_chart_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseries',
+            name='stac_checksum',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
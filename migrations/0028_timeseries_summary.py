@@ -0,0 +1,170 @@
+# Generated by Django 3.2.20 on 2026-10-18 16:45
+
+import re
+import struct
+import zlib
+
+import numpy as np
+import pytz
+from django.db import migrations, models
+
+# Frozen copies of the hydrology.columns helpers as they were when this migration was written, so later
+# changes to the packed format or the summary rules don't change what the migration does.
+_COLUMNS_MAGIC = b'HTS1'
+_VALUES_MAGIC = b'HTV1'
+_HEADER = struct.Struct('<4sQ')
+_TIMEZONE_SUFFIX = re.compile(r'(?:Z|[+-][0-9]{2}:?[0-9]{2})$')
+
+
+def _unpack_columns(blob):
+    timestamps, values = [], []
+    remaining = bytes(blob)
+    while remaining:
+        decompressor = zlib.decompressobj()
+        payload = decompressor.decompress(remaining)
+        remaining = decompressor.unused_data
+        magic, count = _HEADER.unpack_from(payload)
+        offset = _HEADER.size
+        if magic == _COLUMNS_MAGIC:
+            timestamps.append(np.frombuffer(payload, dtype='<i8', count=count, offset=offset).view('datetime64[us]'))
+            offset += 8 * count
+        elif magic != _VALUES_MAGIC:
+            raise ValueError("Unrecognised packed time series data.")
+        values.append(np.frombuffer(payload, dtype='<f8', count=count, offset=offset))
+    timestamps = np.concatenate(timestamps) if timestamps else None
+    return timestamps, (np.concatenate(values) if values else np.empty(0))
+
+
+def _json_columns(rows):
+    timestamps = np.array([
+        np.datetime64(_TIMEZONE_SUFFIX.sub('', str(row.get('timestamp', row.get('ts')))), 'us') for row in rows
+    ], dtype='datetime64[us]')
+    values = np.array([float('nan') if row.get('value') is None else float(row['value']) for row in rows])
+    return timestamps, values
+
+
+def _summarise_values(values):
+    valid = values[np.isfinite(values)]
+    if not len(valid):
+        return None, None
+    return float(valid.sum()), float(valid.max())
+
+
+def _localize(timezone, timestamp):
+    return pytz.timezone(timezone).localize(np.datetime64(timestamp, 'us').item())
+
+
+def summarise_segments(apps, schema_editor):
+    TimeSeriesSegment = apps.get_model('hydrology', 'TimeSeriesSegment')
+    for segment in TimeSeriesSegment.objects.iterator(chunk_size=100):
+        timestamps, values = _unpack_columns(segment.data_binary)
+        segment.total_depth, segment.peak_value = _summarise_values(values)
+        segment.save(update_fields=['total_depth', 'peak_value'])
+
+
+def summarise_time_series(apps, schema_editor):
+    """
+    Fill in the summary columns of existing series, as ``TimeSeries.update_summary`` would.
+
+    A series whose rows can't be read is left with a null ``row_count``, which the app summarises on next write.
+    """
+    TimeSeries = apps.get_model('hydrology', 'TimeSeries')
+    TimeSeriesSegment = apps.get_model('hydrology', 'TimeSeriesSegment')
+    fields = ['start_time', 'end_time', 'step_seconds', 'row_count', 'total_depth', 'peak_value']
+    for time_series in TimeSeries.objects.iterator(chunk_size=100):
+        data = time_series.data
+        rows = data.get('rowData') if isinstance(data, dict) else data
+        try:
+            if rows:
+                timestamps, values = _json_columns(rows)
+            elif time_series.data_binary:
+                timestamps, values = _unpack_columns(time_series.data_binary)
+            else:
+                summary = TimeSeriesSegment.objects.filter(timeseries=time_series).aggregate(
+                    start_time=models.Min('start_time'), end_time=models.Max('end_time'),
+                    row_count=models.Sum('count'), total_depth=models.Sum('total_depth'),
+                    peak_value=models.Max('peak_value'),
+                )
+                summary['row_count'] = summary['row_count'] or 0
+                for field, value in summary.items():
+                    setattr(time_series, field, value)
+                time_series.save(update_fields=fields)
+                continue
+        except (TypeError, ValueError, zlib.error, struct.error):
+            continue
+        time_series.row_count = len(values)
+        time_series.total_depth, time_series.peak_value = _summarise_values(values)
+        if timestamps is None:
+            # Regular storage: the timestamps are implied by the stored start and step
+            if time_series.start_time is not None and len(values):
+                tz = pytz.timezone(time_series.timezone)
+                start = np.datetime64(time_series.start_time.astimezone(tz).replace(tzinfo=None), 'us')
+                step = np.timedelta64(int(round((time_series.step_seconds or 0) * 1_000_000)), 'us')
+                time_series.end_time = _localize(time_series.timezone, start + (len(values) - 1) * step)
+        elif len(timestamps):
+            time_series.start_time = _localize(time_series.timezone, timestamps[0])
+            time_series.end_time = _localize(time_series.timezone, timestamps[-1])
+            steps = np.diff(timestamps.astype('int64'))
+            regular = len(steps) > 0 and steps[0] > 0 and not np.any(steps != steps[0])
+            time_series.step_seconds = steps[0] / 1_000_000 if regular else None
+        else:
+            time_series.start_time = time_series.end_time = time_series.step_seconds = None
+        time_series.save(update_fields=fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hydrology', '0027_timeseries_stac_checksum'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timeseries',
+            name='step_seconds',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Step (seconds)'),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='row_count',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='Row count'),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='total_depth',
+            field=models.FloatField(blank=True, null=True, verbose_name='Total depth'),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='peak_value',
+            field=models.FloatField(blank=True, null=True, verbose_name='Peak value'),
+        ),
+        migrations.AddField(
+            model_name='timeseriessegment',
+            name='total_depth',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='timeseriessegment',
+            name='peak_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='timeseries',
+            index=models.Index(fields=['project', 'start_time'], name='hydrology_ts_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeseries',
+            index=models.Index(fields=['project', 'end_time'], name='hydrology_ts_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeseries',
+            index=models.Index(fields=['project', 'total_depth'], name='hydrology_ts_depth_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeseries',
+            index=models.Index(fields=['project', 'peak_value'], name='hydrology_ts_peak_idx'),
+        ),
+        migrations.RunPython(summarise_segments, migrations.RunPython.noop),
+        migrations.RunPython(summarise_time_series, migrations.RunPython.noop),
+    ]
@@ -1,30 +1,72 @@
 import copy
+import hashlib
 import json
 import os
 import tempfile
 
 import pytz
-import math
-import matplotlib.pyplot as plt
+import numpy as np
 import pystac
 import uuid
 
 from django.contrib.gis.db.models import PointField
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import JSONField
-from datetime import datetime
+from django.db import models, transaction
+from django.db.models import F, JSONField, Max, Min, Sum
+from django.db.models.expressions import RawSQL
+from datetime import datetime, timedelta
 from django.core.files import File
-from io import BytesIO
+from django.core.files.base import ContentFile
+from django.utils.timezone import now
 
 from gn_anuga.models import Project
 from gn_anuga.storage_backends import AnugaDataStorage
+from hydrology.caching import invalidate_project_cache
+from hydrology.charts import RENDERER_VERSION, TIMESERIES_CHART, render_timeseries_chart
+from hydrology.columns import CSV_CHUNK_SIZE, TimeSeriesDataError, clip_columns, columns_to_csv, columns_to_rows, \
+    concatenate_columns, detect_regular_step, empty_columns, is_values_only, merge_summaries, pack_columns, \
+    pack_values, read_csv_columns, regular_timestamps, rows_to_columns, summarise_values, timestamp_key, \
+    unpack_columns
+from hydrology.idf import aeps_from_aris, aris_from_aeps, compile_idf, data_with_depths, interpolate_depths
+from hydrology.stac import STACSchemaUnavailable, validate_stac
 
 User = get_user_model()
 
+# Appends rows to TimeSeries.data in place, for both the {'rowData': [...]} and bare list shapes
+APPEND_JSON_ROWS_SQL = """
+    CASE WHEN jsonb_typeof(data) = 'array' THEN data || %s::jsonb
+    ELSE jsonb_set(COALESCE(data, '{}'::jsonb), '{rowData}', COALESCE(data -> 'rowData', '[]'::jsonb) || %s::jsonb)
+    END
+"""
+
 
 class TimeSeries(models.Model):
+    JSON = 'json'
+    COLUMNAR = 'columnar'
+    REGULAR = 'regular'
+    SEGMENTED = 'segmented'
+    STORAGE_FORMAT_CHOICES = [
+        (JSON, 'JSON rows'),
+        (COLUMNAR, 'Packed columns'),
+        (REGULAR, 'Regular interval'),
+        (SEGMENTED, 'Chunked segments'),
+    ]
+    CHART_PENDING = 'pending'
+    CHART_RENDERING = 'rendering'
+    CHART_READY = 'ready'
+    CHART_FAILED = 'failed'
+    CHART_STATUS_CHOICES = [
+        (CHART_PENDING, 'Pending'),
+        (CHART_RENDERING, 'Rendering'),
+        (CHART_READY, 'Ready'),
+        (CHART_FAILED, 'Failed'),
+    ]
+    SUMMARY_FIELDS = ['start_time', 'end_time', 'row_count', 'total_depth', 'peak_value', 'step_seconds']
+    # Rows per TimeSeriesSegment, and the length above which JSON and columnar series move to segments
+    SEGMENT_SIZE = 100000
+    SEGMENT_THRESHOLD = 200000
+
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='timeseries_created', verbose_name="Created by")
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='timeseries_owner', verbose_name="Owner")
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='timeseries_updated', verbose_name="Updated by")
@@ -37,8 +79,20 @@ class TimeSeries(models.Model):
     location_name = models.CharField(max_length=500, blank=True, null=True)
     timezone = models.CharField(max_length=50, default='UTC', choices=[(tz, tz) for tz in pytz.all_timezones])
     data = JSONField(default=list(), blank=True, null=True)
+    storage_format = models.CharField(max_length=10, choices=STORAGE_FORMAT_CHOICES, default=JSON)
+    data_binary = models.BinaryField(blank=True, null=True)
+    start_time = models.DateTimeField("Start time", blank=True, null=True)
+    step_seconds = models.FloatField("Step (seconds)", blank=True, null=True, db_index=True)
+    end_time = models.DateTimeField("End time", blank=True, null=True)
+    # Summary of the stored rows, kept up to date on every write; row_count is None until first computed
+    row_count = models.PositiveIntegerField("Row count", blank=True, null=True, db_index=True)
+    total_depth = models.FloatField("Total depth", blank=True, null=True)
+    peak_value = models.FloatField("Peak value", blank=True, null=True)
     stac = models.FileField(storage=AnugaDataStorage(), upload_to='timeseries/stac/', blank=True, null=True)
+    stac_checksum = models.CharField(max_length=64, blank=True, default='')
     chart = models.ImageField(storage=AnugaDataStorage(), upload_to='timeseries/chart/', blank=True, null=True)
+    chart_status = models.CharField(max_length=10, choices=CHART_STATUS_CHOICES, default=CHART_PENDING, db_index=True)
+    chart_hash = models.CharField(max_length=64, blank=True, default='')
 
     def __str__(self):
         if self.project:
@@ -48,30 +102,490 @@ class TimeSeries(models.Model):
         return time_series_name
 
     def clean(self):
-        required_keys = {'timestamp', 'value'}
-        for data_index, data_point in enumerate(self.data.get('rowData')):
-            if not required_keys.issubset(data_point):
-                raise ValidationError(f"The {required_keys} fields are required in each data point.")
-
-            timestamp_string = data_point.get('timestamp')
+        if self.json_rows is not None:
+            self.__dict__.pop('_columns_cache', None)  # rows may have been edited in place
+        # Segments are validated as they are written, so only rows held on the instance need checking
+        if self.stored_format != self.SEGMENTED:
             try:
-                datetime.fromisoformat(timestamp_string.rstrip('Z'))
-            except ValueError:
-                raise ValidationError("All timestamps must be in ISO 8601 format.")
+                timestamps, values = self.get_columns()
+            except TimeSeriesDataError as e:
+                raise ValidationError(e.messages)
+            except ValueError as e:
+                raise ValidationError(str(e))
+
+            if self.storage_format == self.REGULAR and len(timestamps) > 1 and detect_regular_step(timestamps) is None:
+                raise ValidationError("A regular time series must have equally spaced, increasing timestamps.")
 
         if self.stac:
-            contents = self.stac.read().decode()
-            stac_dict = json.loads(contents)
-            catalog = pystac.Catalog.from_dict(stac_dict)
-            catalog.validate()
+            with self.stac.open('rb') as stac_file:
+                contents = stac_file.read()
+            # Only validate STAC that has changed since it last passed
+            checksum = hashlib.sha256(contents).hexdigest()
+            if checksum != self.stac_checksum:
+                try:
+                    validate_stac(json.loads(contents))
+                except (ValueError, pystac.STACError, pystac.STACValidationError, STACSchemaUnavailable) as e:
+                    raise ValidationError(f"Invalid STAC catalog: {e}")
+                self.stac_checksum = checksum
 
         if self.timezone not in pytz.all_timezones:
             raise ValidationError("The 'timezone' field must contain a valid timezone.")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_timezone = instance.__dict__.get('timezone')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None or 'timezone' in fields:
+            self._stored_timezone = self.timezone
+
     def save(self, *args, **kwargs):
-        self.full_clean()
-        self.create_chart(save=False)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            stored_timezone = getattr(self, '_stored_timezone', None)
+            if stored_timezone and stored_timezone != self.timezone and self.timezone in pytz.all_timezones and \
+                    self.stored_format in (self.REGULAR, self.SEGMENTED):
+                self.reanchor_to_timezone(stored_timezone)
+            self.full_clean()
+            self.normalise_storage()
+            self.update_summary()
+            # The chart is rendered by the chart worker (hydrology.tasks), not on the request. Segmented series
+            # only change through pending segments, so otherwise their chart is known to be current.
+            data_changed = self.stored_format != self.SEGMENTED or getattr(self, '_pending_segments', None) is not None
+            if not self.chart or (data_changed and self.chart_signature() != self.chart_hash):
+                self.chart_status = self.CHART_PENDING
+            super().save(*args, **kwargs)
+            pending_segments = self.__dict__.pop('_pending_segments', None)
+            if pending_segments is not None:
+                self.write_segments(*pending_segments)
+            elif self.__dict__.pop('_drop_segments', False):
+                self.segments.all().delete()
+        self._stored_timezone = self.timezone
+
+    def reanchor_to_timezone(self, previous_timezone):
+        """
+        Keep the wall-clock timestamps of a regular or segmented series when its timezone changes.
+
+        JSON and columnar rows are stored as wall-clock times, but a regular series is rebuilt from its
+        ``start_time`` instant and segments are found by their instants. Each of those is moved to the same
+        wall-clock time in the new timezone; the segments are updated in the database straight away.
+        """
+        previous, current = pytz.timezone(previous_timezone), pytz.timezone(self.timezone)
+
+        def reanchor(instant):
+            return current.localize(instant.astimezone(previous).replace(tzinfo=None)) if instant else instant
+        self.start_time = reanchor(self.start_time)
+        self.end_time = reanchor(self.end_time)
+        if self.pk:
+            segments = list(self.segments.only('start_time', 'end_time'))
+            for segment in segments:
+                segment.start_time = reanchor(segment.start_time)
+                segment.end_time = reanchor(segment.end_time)
+            TimeSeriesSegment.objects.bulk_update(segments, ['start_time', 'end_time'])
+
+    @property
+    def json_rows(self):
+        """The rows held in ``data`` as JSON, or None when the series lives in ``data_binary``."""
+        if isinstance(self.data, list):
+            return self.data or None
+        if isinstance(self.data, dict):
+            return self.data.get('rowData')
+        return None
+
+    @property
+    def timestamp_key(self):
+        return timestamp_key(self.json_rows or [])
+
+    @property
+    def stored_format(self):
+        """The storage format the series is currently held in, which differs from ``storage_format`` until saved."""
+        if self.json_rows is not None:
+            return self.JSON
+        if self.data_binary:
+            return self.REGULAR if is_values_only(self.data_binary) else self.COLUMNAR
+        if getattr(self, '_pending_segments', None) is not None or self.storage_format == self.SEGMENTED:
+            return self.SEGMENTED
+        if self.pk and self.segments.exists():
+            return self.SEGMENTED
+        return self.storage_format
+
+    @property
+    def local_start_time(self):
+        """``start_time`` as a naive wall-clock datetime in the series' timezone."""
+        if self.start_time is None:
+            return None
+        return self.start_time.astimezone(pytz.timezone(self.timezone)).replace(tzinfo=None)
+
+    def get_columns(self):
+        """
+        Return the series as ``(timestamps, values)`` NumPy arrays.
+
+        JSON rows in ``data`` take precedence over ``data_binary`` and segments, so that rows written by a
+        client are picked up before ``save()`` stores them. The result is cached until the underlying data
+        is replaced; ``clean()`` re-reads JSON rows, since they may have been edited in place.
+        """
+        rows = self.json_rows
+        source, signature = self._columns_source()
+        cached = getattr(self, '_columns_cache', None)
+        if cached is not None and cached[0] is source and cached[1] == signature:
+            return cached[2]
+        if rows is not None:
+            timestamps, values = rows_to_columns(rows)
+            timestamps.setflags(write=False)
+            values.setflags(write=False)
+        elif source is self.data_binary and source:
+            timestamps, values = unpack_columns(self.data_binary)
+            if timestamps is None:
+                timestamps = regular_timestamps(self.local_start_time, self.step_seconds, len(values))
+                timestamps.setflags(write=False)
+        elif source is TimeSeriesSegment:
+            timestamps, values = self.get_columns_between()
+        elif source is not None:
+            timestamps, values = source
+        else:
+            timestamps, values = empty_columns()
+        self._columns_cache = (source, signature, (timestamps, values))
+        return timestamps, values
+
+    def _columns_source(self):
+        rows = self.json_rows
+        if rows is not None:
+            return rows, (len(rows),)
+        pending_segments = getattr(self, '_pending_segments', None)
+        if pending_segments is not None:
+            return pending_segments, (len(pending_segments[1]),)
+        if self.data_binary:
+            return self.data_binary, (len(self.data_binary), self.start_time, self.step_seconds, self.timezone)
+        if self.storage_format == self.SEGMENTED and self.pk:
+            return TimeSeriesSegment, (self.pk, self.end_time, self.timezone)
+        return None, ()
+
+    def get_columns_between(self, start=None, end=None):
+        """
+        Return the ``(timestamps, values)`` between ``start`` and ``end`` inclusive.
+
+        The bounds are naive wall-clock datetimes (or ``datetime64``) and either may be None. For a segmented
+        series only the segments overlapping the range are fetched.
+        """
+        source, signature = self._columns_source()
+        if source is not TimeSeriesSegment:
+            timestamps, values = self.get_columns()
+        else:
+            blobs = self._segments_between(start, end).values_list('data_binary', flat=True)
+            timestamps, values = concatenate_columns([unpack_columns(blob) for blob in blobs])
+        return clip_columns(timestamps, values, start, end)
+
+    def iter_columns_between(self, start=None, end=None, chunk_size=10000):
+        """
+        Yield the ``(timestamps, values)`` between ``start`` and ``end`` in chunks of at most ``chunk_size`` rows.
+
+        A segmented series is read one segment at a time, so memory use doesn't grow with the series length.
+        """
+        source, signature = self._columns_source()
+        if source is not TimeSeriesSegment:
+            blocks = [self.get_columns_between(start, end)]
+        else:
+            blobs = self._segments_between(start, end).values_list('data_binary', flat=True).iterator(chunk_size=1)
+            blocks = (clip_columns(*unpack_columns(blob), start, end) for blob in blobs)
+        for timestamps, values in blocks:
+            for index in range(0, len(values), chunk_size):
+                yield timestamps[index:index + chunk_size], values[index:index + chunk_size]
+
+    def _segments_between(self, start=None, end=None):
+        segments = self.segments.order_by('start_time')
+        if start is not None:
+            segments = segments.filter(end_time__gte=self.localize(start))
+        if end is not None:
+            segments = segments.filter(start_time__lte=self.localize(end))
+        return segments
+
+    def write_segments(self, timestamps, values):
+        """Replace the stored segments with ``(timestamps, values)`` split into ``SEGMENT_SIZE`` chunks."""
+        self.segments.all().delete()
+        self._create_segments(timestamps, values)
+        self._columns_cache = self._columns_source() + ((timestamps, values),)
+
+    def _create_segments(self, timestamps, values):
+        segments = []
+        for index in range(0, len(values), self.SEGMENT_SIZE):
+            segment_timestamps = timestamps[index:index + self.SEGMENT_SIZE]
+            segment_values = values[index:index + self.SEGMENT_SIZE]
+            total_depth, peak_value = summarise_values(segment_values)
+            segments.append(TimeSeriesSegment(
+                timeseries=self,
+                start_time=self.localize(segment_timestamps[0]),
+                end_time=self.localize(segment_timestamps[-1]),
+                count=len(segment_values),
+                total_depth=total_depth,
+                peak_value=peak_value,
+                data_binary=pack_columns(segment_timestamps, segment_values),
+            ))
+        TimeSeriesSegment.objects.bulk_create(segments)
+
+    def _append_segments(self, timestamps, values):
+        """Top up the last segment and start new ones as needed; earlier segments are not touched."""
+        last_segment = self.segments.select_for_update().order_by('-start_time').first()
+        room = 0
+        if last_segment is not None and last_segment.count < self.SEGMENT_SIZE:
+            room = self.SEGMENT_SIZE - last_segment.count
+            total_depth, peak_value = merge_summaries(
+                (last_segment.total_depth, last_segment.peak_value), summarise_values(values[:room])
+            )
+            TimeSeriesSegment.objects.filter(pk=last_segment.pk).update(
+                data_binary=RawSQL("data_binary || %s", [pack_columns(timestamps[:room], values[:room])]),
+                end_time=self.localize(timestamps[:room][-1]),
+                count=F('count') + len(values[:room]),
+                total_depth=total_depth,
+                peak_value=peak_value,
+            )
+        self._create_segments(timestamps[room:], values[room:])
+
+    def set_columns(self, timestamps, values):
+        """Store ``(timestamps, values)`` according to ``storage_format``."""
+        data = self.data if isinstance(self.data, dict) else {}
+        self.__dict__.pop('_pending_segments', None)
+        if self.storage_format == self.REGULAR:
+            step_seconds = detect_regular_step(timestamps)
+            if len(timestamps) > 1 and step_seconds is None:
+                raise ValueError("A regular time series must have equally spaced, increasing timestamps.")
+            start_time = self.localize(timestamps[0]) if len(timestamps) else None
+            self.set_regular(start_time, step_seconds, values)
+        elif self.storage_format == self.COLUMNAR:
+            self.data = {key: value for key, value in data.items() if key != 'rowData'}
+            self.data_binary = pack_columns(timestamps, values)
+        elif self.storage_format == self.SEGMENTED:
+            # Segments need a primary key, so they are written by save()
+            self.data = {key: value for key, value in data.items() if key != 'rowData'}
+            self.data_binary = None
+            self._pending_segments = (timestamps, values)
+        else:
+            self.data = dict(data, rowData=columns_to_rows(timestamps, values, key=self.timestamp_key))
+            self.data_binary = None
+        self._columns_cache = self._columns_source() + ((timestamps, values),)
+
+    def set_regular(self, start_time, step_seconds, values):
+        """Store a fixed-step series as its start, step and values only."""
+        data = self.data if isinstance(self.data, dict) else {}
+        self.storage_format = self.REGULAR
+        self.data = {key: value for key, value in data.items() if key != 'rowData'}
+        self.data_binary = pack_values(values)
+        self.start_time = start_time
+        self.step_seconds = step_seconds
+
+    def normalise_storage(self):
+        """Move the series into the representation ``storage_format`` asks for, moving long series to segments."""
+        stored_format = self.stored_format
+        if self.storage_format in (self.JSON, self.COLUMNAR) and len(self.get_columns()[1]) > self.SEGMENT_THRESHOLD:
+            self.storage_format = self.SEGMENTED
+        if stored_format != self.storage_format:
+            self.set_columns(*self.get_columns())
+            self._drop_segments = stored_format == self.SEGMENTED
+
+    def localize(self, timestamp):
+        """Attach the series' timezone to a naive wall-clock datetime or ``datetime64``."""
+        return pytz.timezone(self.timezone).localize(np.datetime64(timestamp, 'us').item())
+
+    def update_summary(self):
+        """
+        Refresh the summary columns (start and end time, row count, total depth, peak value and step).
+
+        Stored segments are summarised in the database from their own summaries, keeping the existing step.
+        """
+        if self._columns_source()[0] is TimeSeriesSegment:
+            summary = self.segments.aggregate(
+                start_time=Min('start_time'), end_time=Max('end_time'), row_count=Sum('count'),
+                total_depth=Sum('total_depth'), peak_value=Max('peak_value'),
+            )
+            summary['row_count'] = summary['row_count'] or 0
+            for field, value in summary.items():
+                setattr(self, field, value)
+            return
+        timestamps, values = self.get_columns()
+        self.end_time = self.localize(timestamps[-1]) if len(timestamps) else None
+        self.row_count = len(values)
+        self.total_depth, self.peak_value = summarise_values(values)
+        if self.storage_format != self.REGULAR:
+            self.start_time = self.localize(timestamps[0]) if len(timestamps) else None
+            self.step_seconds = detect_regular_step(timestamps)
+
+    def append_rows(self, rows, user=None):
+        """Append a list of ``{'timestamp'|'ts', 'value'}`` rows; see ``append_columns``."""
+        try:
+            timestamps, values = rows_to_columns(rows)
+        except TimeSeriesDataError as e:
+            raise ValidationError(e.messages)
+        return self.append_columns(timestamps, values, user=user)
+
+    def append_csv(self, lines, user=None, chunk_size=CSV_CHUNK_SIZE, progress=None):
+        """
+        Append CSV text lines, with a header row, to the series and return how many rows were added.
+
+        The file is parsed and appended ``chunk_size`` rows at a time, so memory use doesn't depend on its size.
+        The series is moved to segmented storage first, so each chunk only writes new segments rather than
+        rewriting the whole stored value. The upload is all or nothing: it stops at the
+        first chunk with bad rows and raises a ValidationError listing them. ``progress(rows_appended)`` is
+        called after each chunk.
+        """
+        appended = 0
+        with transaction.atomic():
+            stored = TimeSeries.objects.select_for_update().only('storage_format').get(pk=self.pk)
+            if stored.storage_format != self.SEGMENTED:
+                self._move_to_segments()
+            try:
+                for timestamps, values, messages in read_csv_columns(lines, chunk_size):
+                    if messages:
+                        raise ValidationError(messages)
+                    appended += self.append_columns(timestamps, values, user=user)
+                    if progress is not None:
+                        progress(appended)
+            except TimeSeriesDataError as e:
+                raise ValidationError(e.messages)
+            except UnicodeDecodeError:
+                raise ValidationError("The CSV file must be UTF-8 encoded.")
+        return appended
+
+    def _move_to_segments(self):
+        """Rewrite the stored series as segments, in the database and on this instance; the row must be locked."""
+        stored = TimeSeries.objects.get(pk=self.pk)
+        timestamps, values = stored.get_columns()
+        # Drop rowData, even an empty one, or its JSON rows would take precedence over the segments
+        data = {key: value for key, value in stored.data.items() if key != 'rowData'} \
+            if isinstance(stored.data, dict) else []
+        stored.segments.all().delete()
+        stored._create_segments(timestamps, values)
+        TimeSeries.objects.filter(pk=self.pk).update(storage_format=self.SEGMENTED, data=data, data_binary=None)
+        self.storage_format = self.SEGMENTED
+        self.data = data
+        self.data_binary = None
+        self.__dict__.pop('_columns_cache', None)
+
+    def append_columns(self, timestamps, values, user=None):
+        """
+        Append ``(timestamps, values)`` to the end of the series and return how many rows were added.
+
+        Only the new rows are validated, against the stored ``end_time``. They are appended in the database
+        (a ``jsonb`` concatenation, an extra packed frame, or the last segment), so the existing series is
+        neither loaded nor re-serialised. A JSON or columnar series that grows past ``SEGMENT_THRESHOLD`` is
+        moved to segments first. The chart is queued for the chart worker.
+        """
+        if not len(timestamps):
+            return 0
+
+        with transaction.atomic():
+            current = TimeSeries.objects.select_for_update().filter(pk=self.pk).values(
+                'storage_format', 'timezone', 'start_time', 'end_time', 'step_seconds', 'row_count', 'total_depth',
+                'peak_value'
+            ).annotate(uses_ts=RawSQL("COALESCE(data -> 'rowData', data) -> 0 ? 'ts'", ())).get()
+            self.timezone = current['timezone']
+            if current['row_count'] is None:
+                # Series saved before the summary was tracked: compute it the slow way, once
+                stored = TimeSeries.objects.get(pk=self.pk)
+                stored.update_summary()
+                current.update({field: getattr(stored, field) for field in self.SUMMARY_FIELDS})
+            end_time = current['end_time']
+            last_timestamp = None
+            if end_time is not None:
+                last_timestamp = np.datetime64(end_time.astimezone(pytz.timezone(self.timezone)).replace(tzinfo=None), 'us')
+                if timestamps[0] <= last_timestamp:
+                    raise ValidationError(f"Appended rows must start after the last timestamp ({last_timestamp}).")
+
+            # The row is locked, so the summary can be updated from the values read above
+            total_depth, peak_value = merge_summaries(
+                (current['total_depth'], current['peak_value']), summarise_values(values)
+            )
+            updates = {
+                'start_time': current['start_time'] if last_timestamp is not None else self.localize(timestamps[0]),
+                'end_time': self.localize(timestamps[-1]),
+                'row_count': current['row_count'] + len(values),
+                'total_depth': total_depth,
+                'peak_value': peak_value,
+                'updated_at': now(),
+                'chart_status': self.CHART_PENDING,
+            }
+            if user is not None:
+                updates['updated_by'] = user
+            storage_format = current['storage_format']
+            if storage_format in (self.JSON, self.COLUMNAR) and \
+                    current['row_count'] + len(values) > self.SEGMENT_THRESHOLD:
+                self._move_to_segments()
+                storage_format = self.SEGMENTED
+            if storage_format != self.REGULAR:
+                # Still equally spaced only if the new rows continue the existing step
+                continued = timestamps if last_timestamp is None else np.concatenate([[last_timestamp], timestamps])
+                step_seconds = detect_regular_step(continued)
+                if current['row_count'] > 1 and step_seconds != current['step_seconds']:
+                    step_seconds = None
+                updates['step_seconds'] = step_seconds
+            if storage_format == self.REGULAR:
+                step_seconds = current['step_seconds']
+                if last_timestamp is not None:
+                    gap_seconds = (timestamps[0] - last_timestamp) / np.timedelta64(1, 's')
+                    step_seconds = step_seconds or gap_seconds
+                    new_step = detect_regular_step(np.concatenate([[last_timestamp], timestamps]))
+                    if new_step != step_seconds:
+                        raise ValidationError(f"Appended rows must continue the regular {step_seconds} second step.")
+                else:
+                    step_seconds = detect_regular_step(timestamps)
+                    if len(timestamps) > 1 and step_seconds is None:
+                        raise ValidationError("A regular time series must have equally spaced, increasing timestamps.")
+                updates['step_seconds'] = step_seconds
+                frame = pack_values(values)
+            elif storage_format == self.COLUMNAR:
+                frame = pack_columns(timestamps, values)
+            elif storage_format == self.SEGMENTED:
+                frame = None
+                self._append_segments(timestamps, values)
+            else:
+                frame = None
+                new_rows = columns_to_rows(timestamps, values, key='ts' if current['uses_ts'] else 'timestamp')
+                payload = json.dumps(new_rows)
+                updates['data'] = RawSQL(APPEND_JSON_ROWS_SQL, [payload, payload])
+            if frame is not None:
+                updates['data_binary'] = RawSQL("COALESCE(data_binary, ''::bytea) || %s", [frame])
+            TimeSeries.objects.filter(pk=self.pk).update(**updates)
+            invalidate_project_cache(self.project_id)
+
+        # Mirror the database change on this instance, without loading anything that was deferred
+        deferred = self.get_deferred_fields()
+        for field, value in updates.items():
+            if field in ('data', 'data_binary'):
+                continue
+            setattr(self, field, value)
+        if storage_format == self.SEGMENTED:
+            pass
+        elif frame is not None and 'data_binary' not in deferred:
+            self.data_binary = bytes(self.data_binary or b'') + frame
+        elif frame is None and 'data' not in deferred:
+            if self.json_rows is not None:
+                self.json_rows.extend(new_rows)
+            else:
+                self.data = dict(self.data if isinstance(self.data, dict) else {}, rowData=new_rows)
+        return len(timestamps)
+
+    def compact_regular(self):
+        """
+        Switch an equally spaced series to the regular storage format.
+
+        Returns True if the series was converted; the caller is responsible for saving it.
+        """
+        if self.storage_format == self.REGULAR:
+            return False
+        timestamps, values = self.get_columns()
+        if detect_regular_step(timestamps) is None:
+            return False
+        self.storage_format = self.REGULAR
+        self.set_columns(timestamps, values)
+        return True
+
+    @property
+    def row_data(self):
+        """The ag-Grid ``rowData`` list, built from the packed columns when the series is not stored as JSON."""
+        rows = self.json_rows
+        if rows is not None:
+            return rows
+        return columns_to_rows(*self.get_columns())
 
     def import_stac_from_simple_array(self, time_series_list):
         catalog = pystac.Catalog(
@@ -114,28 +628,179 @@ class TimeSeries(models.Model):
             catalog.normalize_and_save(catalog_path, catalog_type)
             self.stac.save(f"{self}/catalog.json", File(open(catalog_path, 'rb')))
 
+    def import_stac_as_table(self, time_series_list=None):
+        """
+        Write a STAC catalog holding one Item whose CSV asset contains every row of the series.
+
+        Unlike ``import_stac_from_simple_array``, which creates an Item per row, the number of stored
+        objects stays fixed as the series grows. Without ``time_series_list`` the series' own data is used.
+        Each export is uploaded to a directory of its own, named after the catalog's id.
+        """
+        if time_series_list is None:
+            timestamps, values = self.get_columns()
+        else:
+            timestamps, values = rows_to_columns(time_series_list)
+        if not len(timestamps):
+            raise ValueError("Cannot export an empty time series to STAC.")
+        start_time, end_time = self.localize(timestamps.min()), self.localize(timestamps.max())
+
+        catalog = pystac.Catalog(
+            id=uuid.uuid4().hex,
+            description='desc',
+            title='title'
+        )
+        collection = pystac.Collection(
+            id=uuid.uuid4().hex,
+            description='Collection Description',
+            extent=pystac.Extent(
+                spatial=pystac.SpatialExtent([[-180, -90, 180, 90]]),
+                temporal=pystac.TemporalExtent([[start_time, end_time]])
+            ),
+            title='title',
+        )
+        item = pystac.Item(
+            id=uuid.uuid4().hex,
+            geometry=None,
+            bbox=None,
+            datetime=None,
+            start_datetime=start_time,
+            end_datetime=end_time,
+            properties={'row_count': len(timestamps)}
+        )
+        collection.add_item(item)
+        catalog.add_child(collection)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            catalog.normalize_hrefs(temp_dir)
+            # CSV rather than Parquet: pyarrow is optional (see hydrology.renderers), not a requirement of the app
+            table_path = os.path.join(os.path.dirname(item.get_self_href()), 'series.csv')
+            os.makedirs(os.path.dirname(table_path), exist_ok=True)
+            with open(table_path, 'wb') as table_file:
+                table_file.write(columns_to_csv(timestamps, values))
+            item.add_asset('data', pystac.Asset(href=table_path, title=self.name, media_type='text/csv', roles=['data']))
+            item.make_asset_hrefs_relative()
+            catalog.save(pystac.CatalogType.SELF_CONTAINED)
+            self.stac.name = self._upload_stac_tree(temp_dir, f"{self}/{catalog.id}")
+        self.save()
+
+    def _upload_stac_tree(self, directory, prefix):
+        """
+        Upload the STAC tree saved in ``directory`` to storage under ``prefix`` and return the catalog's name.
+
+        The catalog's relative links only resolve if every file keeps its name, so a storage that renames a file
+        to avoid a collision makes the upload fail with ValueError, and the files already uploaded are removed.
+        """
+        storage = self.stac.storage
+        uploaded = []
+        try:
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    relative_path = os.path.relpath(path, directory).replace(os.sep, '/')
+                    name = self.stac.field.generate_filename(self, f"{prefix}/{relative_path}")
+                    with open(path, 'rb') as stac_file:
+                        saved_name = storage.save(name, File(stac_file))
+                    uploaded.append(saved_name)
+                    if saved_name != name:
+                        raise ValueError(f"Cannot upload the STAC catalog: {name} already exists in storage.")
+        except Exception:
+            for saved_name in uploaded:
+                storage.delete(saved_name)
+            raise
+        return self.stac.field.generate_filename(self, f"{prefix}/catalog.json")
+
     @property
     def data_with_datetimes(self):
-        data_with_datetimes = []
         tz = pytz.timezone(self.timezone)
-        for data_point in self.data.get('rowData'):
-            data_point_copy = data_point.copy()
-            data_point_copy['timestamp'] = datetime.fromisoformat(data_point['timestamp'].rstrip('Z')).replace(tzinfo=tz)
-            data_with_datetimes.append(data_point_copy)
-        return data_with_datetimes
+        key = self.timestamp_key
+        timestamps, values = self.get_columns()
+        return [
+            {key: timestamp.replace(tzinfo=tz), 'value': value}
+            for timestamp, value in zip(timestamps.tolist(), values.tolist())
+        ]
+
+    def chart_signature(self):
+        """Content hash of everything the chart is drawn from: the plotted columns and the chart template."""
+        timestamps, values = self.get_columns()
+        digest = hashlib.sha256(f'{RENDERER_VERSION}:{TIMESERIES_CHART!r}'.encode())
+        digest.update(timestamps.tobytes())
+        digest.update(values.tobytes())
+        return digest.hexdigest()
 
     def create_chart(self, save=True):
-        filename = f'{self.name}.png'
-        timestamps = [item['timestamp'] for item in self.data.get('rowData')]
-        values = [str(item['value']) for item in self.data.get('rowData')]
-        plt.bar(timestamps, values)
-        plt.tight_layout()  # Adjust layout to prevent cut-off
+        # Charts are stored by content hash, so identical series share one image and it is rendered once
+        chart_hash = self.chart_signature()
+        filename = f'{chart_hash}.png'
+        name = self.chart.field.generate_filename(self, filename)
+        if self.chart.storage.exists(name):
+            self.chart.name = name
+        else:
+            timestamps, values = self.get_columns()
+            png = render_timeseries_chart(timestamps, values)
+            self.chart.save(filename, ContentFile(png, name=filename), save=False)
+        self.chart_hash = chart_hash
+        if save:
+            self.save()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'start_time'], name='hydrology_ts_start_idx'),
+            models.Index(fields=['project', 'end_time'], name='hydrology_ts_end_idx'),
+            models.Index(fields=['project', 'total_depth'], name='hydrology_ts_depth_idx'),
+            models.Index(fields=['project', 'peak_value'], name='hydrology_ts_peak_idx'),
+        ]
+
+
+class TimeSeriesSegment(models.Model):
+    """A fixed-size chunk of a long TimeSeries, stored as packed columns and keyed by its time range."""
+    timeseries = models.ForeignKey(TimeSeries, on_delete=models.CASCADE, related_name='segments')
+    start_time = models.DateTimeField("Start time")
+    end_time = models.DateTimeField("End time")
+    count = models.PositiveIntegerField(default=0)
+    total_depth = models.FloatField(blank=True, null=True)
+    peak_value = models.FloatField(blank=True, null=True)
+    data_binary = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.timeseries_id}: {self.start_time} - {self.end_time}"
+
+    class Meta:
+        ordering = ['timeseries', 'start_time']
+        indexes = [
+            models.Index(fields=['timeseries', 'start_time', 'end_time'], name='hydrology_segment_range_idx'),
+        ]
+
+
+class IDFTableQuerySet(models.QuerySet):
 
-        # Save it to a BytesIO object
-        file_buffer = BytesIO()
-        plt.savefig(file_buffer, format='png')
-        file_buffer.seek(0)
-        self.chart.save(filename, File(file_buffer, name=filename), save=save)
+    def convert_units(self, batch_size=500):
+        """
+        Convert every table that isn't stored in its ``saved_units`` yet, with one bulk update per batch.
+
+        Returns how many tables were converted. Tables whose units already match are only marked complete.
+        """
+        pending = self.filter(conversion_complete=False)
+        unchanged = pending.filter(original_units=F('saved_units'))
+        project_ids = set(unchanged.values_list('project_id', flat=True))
+        unchanged.update(conversion_complete=True, updated_at=now())
+        converted = 0
+        tables = []
+        for table in pending.exclude(original_units=F('saved_units')).iterator(chunk_size=batch_size):
+            table.convert_units()
+            table.updated_at = now()
+            tables.append(table)
+            project_ids.add(table.project_id)
+            if len(tables) == batch_size:
+                self.model.objects.bulk_update(tables, ['data', 'conversion_complete', 'updated_at'])
+                converted += len(tables)
+                tables = []
+        if tables:
+            self.model.objects.bulk_update(tables, ['data', 'conversion_complete', 'updated_at'])
+            converted += len(tables)
+        # bulk_update() sends no post_save signals
+        for project_id in project_ids:
+            invalidate_project_cache(project_id)
+        return converted
 
 
 class IDFTable(models.Model):
@@ -152,6 +817,8 @@ class IDFTable(models.Model):
         CM: 10,
         IN: 25.4,
     }
+    # Fields save() compares with the database to decide whether the depths in ``data`` need converting
+    CONVERTED_FIELDS = ('data', 'original_units', 'saved_units')
 
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='idf_table_created', verbose_name="Created by")
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='idf_table_owner', verbose_name="Owner")
@@ -170,56 +837,229 @@ class IDFTable(models.Model):
     selected_durations = JSONField("Selected Durations", blank=True, null=True)
     selected_frequencies = JSONField("Selected Frequencies", blank=True, null=True)
 
+    objects = IDFTableQuerySet.as_manager()
+
     def convert_to_mm(self, value):
-        conversion_factor = self.UNIT_CONVERSIONS[self.original_units]
-        return value * conversion_factor
+        """Convert a depth, or an array of depths, from ``original_units`` to millimetres."""
+        converted = np.asarray(value, dtype=float) * self.UNIT_CONVERSIONS[self.original_units]
+        return float(converted) if converted.ndim == 0 else converted
+
+    def convert_units(self):
+        """
+        Convert the depths in ``data`` from ``original_units`` to ``saved_units`` in one pass over the matrix.
+
+        Does nothing once ``conversion_complete`` is set, so it is safe to call again. Returns whether the
+        depths changed.
+        """
+        if self.conversion_complete:
+            return False
+        self.conversion_complete = True
+        return self._scale_depths(self.original_units, self.saved_units)
+
+    def _scale_depths(self, from_units, to_units):
+        if from_units == to_units:
+            return False
+        factor = self.UNIT_CONVERSIONS[from_units] / self.UNIT_CONVERSIONS[to_units]
+        matrix = self.idf_matrix
+        depths = np.round(matrix.depths * factor, 6)
+        depths.setflags(write=False)
+        self.data = data_with_depths(self.data, matrix, depths)
+        self._idf_matrix = (self.data, matrix._replace(depths=depths))
+        return True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_stored_depths()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._remember_stored_depths(fields)
+
+    def _remember_stored_depths(self, fields=None):
+        # What the database holds for the converted fields, so save() can tell whether new depths were sent
+        stored = dict(getattr(self, '_stored_depths', {}))
+        for field in self.CONVERTED_FIELDS:
+            if field in self.__dict__ and (fields is None or field in fields):
+                stored[field] = copy.deepcopy(self.__dict__[field])
+        self._stored_depths = stored
+
+    def _stored_value(self, field):
+        """The value of ``field`` last loaded from or saved to the database, or None if it isn't known or unchanged."""
+        stored = getattr(self, '_stored_depths', {})
+        if field in stored and field in self.__dict__ and self.__dict__[field] != stored[field]:
+            return stored[field]
+        return None
 
     def clean(self):
-        pass
+        try:
+            self.idf_matrix
+        except ValueError as e:
+            raise ValidationError({'data': str(e)})
 
     def save(self, *args, **kwargs):
+        self.__dict__.pop('_idf_matrix', None)  # data may have been edited in place
         self.full_clean()
+        if self.conversion_complete:
+            # Depths are read and written in saved_units, so an edited grid is only converted when it comes with
+            # new original_units, or when the client asks for it by sending conversion_complete=false
+            previous_saved_units = self._stored_value('saved_units')
+            if self._stored_value('original_units') is not None and self._stored_value('data') is not None:
+                self.conversion_complete = False
+            elif previous_saved_units is not None:
+                self._scale_depths(previous_saved_units, self.saved_units)
+        self.convert_units()
         super().save(*args, **kwargs)
+        self._remember_stored_depths()
+
+    @property
+    def idf_matrix(self):
+        """
+        ``data`` compiled to an ``IDFMatrix`` of NumPy arrays (see ``hydrology.idf``).
+
+        It is compiled on first use and kept until ``data`` is replaced or the table is saved again.
+        """
+        cached = self.__dict__.get('_idf_matrix')
+        if cached is None or cached[0] is not self.data:
+            cached = (self.data, compile_idf(self.data))
+            self._idf_matrix = cached
+        return cached[1]
+
+    @property
+    def durations_in_mins(self):
+        return self.idf_matrix.durations.tolist()
+
+    @property
+    def frequencies(self):
+        """Depths for each frequency column, keyed by field name and in ``durations_in_mins`` order."""
+        matrix = self.idf_matrix
+        return {field: matrix.depths[:, i].tolist() for i, field in enumerate(matrix.fields)}
+
+    @property
+    def frequencies_filtered(self):
+        """``frequencies`` limited to the ARIs in ``selected_frequencies``, or all of them if none are selected."""
+        if not self.selected_frequencies:
+            return self.frequencies
+        matrix = self.idf_matrix
+        selected = np.isin(matrix.aris, np.asarray(self.selected_frequencies, dtype=float))
+        return {field: matrix.depths[:, i].tolist() for i, field in enumerate(matrix.fields) if selected[i]}
+
+    def depth(self, duration_in_minutes, frequency):
+        """The depth for a duration in ``durations_in_mins`` and a frequency column's field name."""
+        matrix = self.idf_matrix
+        rows = np.flatnonzero(matrix.durations == duration_in_minutes)
+        if not len(rows):
+            raise ValueError(f"{self} has no {duration_in_minutes} minute duration.")
+        if frequency not in matrix.fields:
+            raise ValueError(f"{self} has no {frequency} frequency.")
+        depth = matrix.depths[rows[0], matrix.fields.index(frequency)]
+        if np.isnan(depth):
+            raise ValueError(f"{self} has no {frequency} depth for the {duration_in_minutes} minute duration.")
+        return float(depth)
+
+    def interpolate_depths(self, durations, aeps):
+        """
+        Depths for durations (minutes) and AEPs (%) that needn't be in the table, e.g. 25 minutes at 1-in-75.
+
+        Takes scalars or arrays, which broadcast against each other, and interpolates log-log over the compiled
+        grid (see ``hydrology.idf.interpolate_depths``). Points the grid doesn't cover are NaN.
+        """
+        depths = interpolate_depths(self.idf_matrix, durations, aeps)
+        return float(depths) if depths.ndim == 0 else depths
 
     @staticmethod
     def ari_from_aep(aep):
-        if aep > 100:
+        """ARI (years) for an AEP (%), or an array of them for an array."""
+        aeps = np.asarray(aep, dtype=float)
+        if np.any(aeps > 100):
             raise ValidationError('AEP should be less than 100%')
-        return -(1 / (math.log(1 - aep/100)))
+        aris = aris_from_aeps(aeps)
+        return float(aris) if aris.ndim == 0 else aris
 
     @staticmethod
     def aep_from_ari(ari):
-        return 100 * (1 - math.exp((-1/ari)))
+        """AEP (%) for an ARI (years), or an array of them for an array."""
+        aeps = aeps_from_aris(ari)
+        return float(aeps) if aeps.ndim == 0 else aeps
 
     def create_timeseries(self, duration_in_minutes, frequency, temporal_pattern, user=None):
-        depths = self.frequencies_filtered[frequency]
-        duration_index = self.durations_in_mins.index(duration_in_minutes)
-        total_depth_value = depths[duration_index]
-        timeseries_data = list()
-        timestep_in_seconds = 60 * (duration_in_minutes / len(temporal_pattern.pattern))
-
-        for index, relative_proportion in enumerate(temporal_pattern.pattern):
-            current_timestamp_python = datetime.fromtimestamp(index * timestep_in_seconds, pytz.UTC)
-            current_timestamp_iso8601 = current_timestamp_python.isoformat()
-            timeseries_data.append({
-                'ts': current_timestamp_iso8601,
-                'value': total_depth_value * relative_proportion
-            })
-
-        # Add the final timestamp to ensure we have a timeseries the same duration as duration_in_minutes
-        final_index = len(temporal_pattern.pattern)
-        current_timestamp_python = datetime.fromtimestamp(final_index * timestep_in_seconds, pytz.UTC)
-        current_timestamp_iso8601 = current_timestamp_python.isoformat()
-        timeseries_data.append({
-            'ts': current_timestamp_iso8601,
-            'value': total_depth_value * temporal_pattern.pattern[-1]
-        })
-
-        timeseries = TimeSeries.objects.create(
-            name=f"{self.name} - {frequency} - {duration_in_minutes} minutes",
-            data=timeseries_data,
-            created_by=user
+        total_depth_value = self.depth(duration_in_minutes, frequency)
+        pattern = temporal_pattern.proportions
+        timestep_in_seconds = 60 * (duration_in_minutes / len(pattern))
+
+        # Repeat the final proportion so the timeseries covers the full duration_in_minutes
+        values = total_depth_value * np.append(pattern, pattern[-1])
+
+        timeseries = self._design_storm(
+            f"{self.name} - {frequency} - {duration_in_minutes} minutes", timestep_in_seconds, values, user
         )
+        timeseries.save()
+        return timeseries
+
+    def create_timeseries_batch(self, temporal_patterns, durations=None, frequencies=None, user=None):
+        """
+        Create a design storm for every combination of duration, frequency and temporal pattern.
+
+        ``durations`` default to ``selected_durations`` (or every duration) and ``frequencies``, which are field
+        names, to those in ``frequencies_filtered``. The hyetographs of all patterns with the same number of
+        increments come from one broadcast multiplication, and the storms are written with ``bulk_create``:
+        ``save()`` isn't called, so the summary columns are filled in here and the charts are left pending for
+        the chart worker. Raises ValueError if a duration or frequency is missing or has no depth.
+        """
+        matrix = self.idf_matrix
+        if durations is None:
+            durations = self.selected_durations or matrix.durations
+        durations = np.asarray(durations, dtype=float)
+        frequencies = list(self.frequencies_filtered if frequencies is None else frequencies)
+        missing = [f"{duration:g} minute duration" for duration in durations[~np.isin(durations, matrix.durations)]]
+        missing += [f"{frequency} frequency" for frequency in frequencies if frequency not in matrix.fields]
+        if missing:
+            raise ValueError(f"{self} has no {', '.join(missing)}.")
+        rows = np.searchsorted(matrix.durations, durations)
+        depths = matrix.depths[np.ix_(rows, [matrix.fields.index(frequency) for frequency in frequencies])]
+        blank = np.argwhere(np.isnan(depths))
+        if len(blank):
+            cells = ', '.join(f"{frequency} at {duration:g} minutes" for frequency, duration in (
+                (frequencies[j], durations[i]) for i, j in blank))
+            raise ValueError(f"{self} has no depth for {cells}.")
+
+        proportions = [temporal_pattern.proportions for temporal_pattern in temporal_patterns]
+        hyetographs = {}
+        for length in {len(pattern) for pattern in proportions}:
+            indices = [k for k, pattern in enumerate(proportions) if len(pattern) == length]
+            # Repeat the final proportion so each timeseries covers its full duration
+            patterns = np.stack([np.append(proportions[k], proportions[k][-1]) for k in indices])
+            values = depths[:, :, np.newaxis, np.newaxis] * patterns  # durations x frequencies x patterns x steps
+            steps = 60 * durations / length
+            totals, peaks = values.sum(axis=-1), values.max(axis=-1)
+            for position, k in enumerate(indices):
+                hyetographs[k] = (steps, values[:, :, position], totals[:, :, position], peaks[:, :, position])
+
+        start_time = datetime.fromtimestamp(0, pytz.UTC)
+        storms = []
+        for k, temporal_pattern in enumerate(temporal_patterns):
+            steps, values, totals, peaks = hyetographs[k]
+            for i, duration in enumerate(durations):
+                for j, frequency in enumerate(frequencies):
+                    storm = self._design_storm(
+                        f"{self.name} - {frequency} - {duration:g} minutes - {temporal_pattern.name}",
+                        steps[i], values[i, j], user
+                    )
+                    storm.end_time = start_time + timedelta(minutes=duration)
+                    storm.row_count = values.shape[-1]
+                    storm.total_depth = float(totals[i, j])
+                    storm.peak_value = float(peaks[i, j])
+                    storms.append(storm)
+        with transaction.atomic():
+            TimeSeries.objects.bulk_create(storms, batch_size=500)
+        invalidate_project_cache(self.project_id)  # bulk_create sends no post_save signals
+        return storms
+
+    def _design_storm(self, name, step_seconds, values, user):
+        """An unsaved regular TimeSeries of ``values`` starting at the Unix epoch, in this table's project."""
+        timeseries = TimeSeries(name=name, data=dict(), project_id=self.project_id, created_by=user)
+        timeseries.set_regular(datetime.fromtimestamp(0, pytz.UTC), step_seconds, values)
         return timeseries
 
     def __str__(self):
@@ -242,6 +1082,14 @@ class TemporalPattern(models.Model):
     description = models.TextField(blank=True, null=True)
     data = JSONField("Pattern", blank=True, null=True)
 
+    @property
+    def proportions(self):
+        """The pattern as a float array of the fraction of the total depth in each increment."""
+        data = self.data
+        if isinstance(data, dict):
+            return np.array([float(row['percentage']) for row in data.get('rowData') or []]) / 100
+        return np.asarray(data or [], dtype=float)
+
     def clean(self):
         if self.data:
             rowData = self.data.get('rowData')
@@ -0,0 +1,86 @@
+"""
+Binary renderers for the hydrology API.
+
+``MessagePackRenderer`` is offered on every endpoint and ``ArrowStreamRenderer`` on time-series detail views,
+each only when its library (``msgpack``, ``pyarrow``) is installed. Both are "columnar": for them the time-series
+serializer emits ``data.columns`` as NumPy arrays instead of ``rowData``, which they write as contiguous typed
+buffers, so clients can decode a series without allocating an object per row.
+"""
+import json
+
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from hydrology.columns import empty_columns
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+
+def _encode_msgpack(obj):
+    if hasattr(obj, 'dtype') and hasattr(obj, 'tobytes'):
+        # NumPy arrays become {dtype, shape, data}, e.g. dtype '<M8[us]' (int64 microseconds) or '<f8' (float64)
+        return {'dtype': obj.dtype.str, 'shape': list(obj.shape), 'data': obj.tobytes()}
+    return JSONEncoder().default(obj)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode_msgpack)
+
+
+class ArrowStreamRenderer(renderers.BaseRenderer):
+    """
+    Write one time series as an Arrow IPC stream: a (timestamp, value) table, with every other field of the
+    response JSON-encoded in the ``hydrology`` schema metadata. Timestamps are naive wall-clock times in the
+    series' timezone, as in ``rowData``.
+    """
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        payload = dict(data or {})
+        series = dict(payload['data']) if isinstance(payload.get('data'), dict) else {}
+        columns = series.pop('columns', None)
+        if 'data' in payload:
+            payload['data'] = series
+        if columns is None:
+            columns = dict(zip(('timestamp', 'value'), empty_columns()))
+        table = pyarrow.table(
+            {name: pyarrow.array(column) for name, column in columns.items()},
+            metadata={'hydrology': json.dumps(payload, cls=JSONEncoder)},
+        )
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def hydrology_renderers(arrow=False):
+    """The default renderers plus whichever binary renderers are installed."""
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES)
+    if msgpack is not None:
+        renderer_classes.append(MessagePackRenderer)
+    if arrow and pyarrow is not None:
+        renderer_classes.append(ArrowStreamRenderer)
+    return renderer_classes
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from hydrology.columns import columns_to_rows
 from hydrology.models import IDFTable, TemporalPattern, TimeSeries
 
 import logging
@@ -10,7 +12,41 @@ User = get_user_model()
 from rest_framework.serializers import SerializerMethodField
 
 
-class IDFTableSerializer(serializers.ModelSerializer):
+def field_list(value):
+    """Split a comma-separated ``?fields=``/``?omit=`` value into field names."""
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class ProjectedModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer whose output can be narrowed with ``?fields=`` and ``?omit=`` (comma-separated names).
+
+    ``Meta.deferred_fields`` are left out of list responses, and deferred in the list query, unless they are
+    named in ``?fields=``.
+    """
+
+    @classmethod
+    def deferred_fields(cls, request):
+        """The ``Meta.deferred_fields`` that a list response to ``request`` doesn't include."""
+        requested = field_list(request.query_params.get('fields'))
+        return [name for name in getattr(cls.Meta, 'deferred_fields', []) if name not in requested]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+        requested = field_list(request.query_params.get('fields'))
+        omitted = field_list(request.query_params.get('omit'))
+        if getattr(self.context.get('view'), 'action', None) == 'list':
+            omitted += self.deferred_fields(request)
+        for name in list(fields):
+            if (requested and name not in requested) or name in omitted:
+                fields.pop(name)
+        return fields
+
+
+class IDFTableSerializer(ProjectedModelSerializer):
 
     class Meta:
         model = IDFTable
@@ -29,6 +65,7 @@ class IDFTableSerializer(serializers.ModelSerializer):
         #     'id'
         #     ] + list(widgets.keys()) + IDFTable.FREQUENCY_FIELD_LABELS
         fields = '__all__'
+        deferred_fields = ['data']
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -36,15 +73,48 @@ class IDFTableSerializer(serializers.ModelSerializer):
         return representation
 
 
-class TemporalPatternSerializer(serializers.ModelSerializer):
+class TemporalPatternSerializer(ProjectedModelSerializer):
 
     class Meta:
         model = TemporalPattern
         fields = '__all__'
+        deferred_fields = ['data']
 
 
-class TimeSeriesSerializer(serializers.ModelSerializer):
+class TimeSeriesSerializer(ProjectedModelSerializer):
 
     class Meta:
         model = TimeSeries
-        fields = '__all__'
+        exclude = ['data_binary']
+        read_only_fields = [
+            'chart', 'chart_status', 'chart_hash', 'stac_checksum', 'end_time', 'row_count', 'total_depth', 'peak_value'
+        ]
+        deferred_fields = ['data']
+
+    @classmethod
+    def deferred_fields(cls, request):
+        # data_binary holds the rows of non-JSON series, so it is only needed alongside data
+        deferred = super().deferred_fields(request)
+        return deferred + ['data_binary'] if 'data' in deferred else deferred
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if 'data' not in self.fields:
+            return representation
+        columns = self.context.get('columns')
+        data = representation.get('data')
+        request = self.context.get('request')
+        if getattr(getattr(request, 'accepted_renderer', None), 'columnar', False):
+            # Binary renderers write the NumPy columns directly rather than one dict per row
+            timestamps, values = columns if columns is not None else instance.get_columns()
+            data = {key: value for key, value in data.items() if key != 'rowData'} if isinstance(data, dict) else {}
+            representation['data'] = dict(data, columns={instance.timestamp_key: timestamps, 'value': values})
+        elif columns is not None:
+            # A window or resampled view of the series prepared by the view
+            representation['data'] = dict(
+                data if isinstance(data, dict) else {},
+                rowData=columns_to_rows(*columns, key=instance.timestamp_key)
+            )
+        elif instance.json_rows is None and instance.storage_format != TimeSeries.JSON:
+            representation['data'] = dict(data if isinstance(data, dict) else {}, rowData=instance.row_data)
+        return representation
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from hydrology.caching import invalidate_project_cache
+from hydrology.models import IDFTable, TemporalPattern, TimeSeries
+
+
+@receiver(post_save, sender=IDFTable)
+@receiver(post_save, sender=TemporalPattern)
+@receiver(post_save, sender=TimeSeries)
+@receiver(post_delete, sender=IDFTable)
+@receiver(post_delete, sender=TemporalPattern)
+@receiver(post_delete, sender=TimeSeries)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    invalidate_project_cache(instance.project_id)
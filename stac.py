@@ -0,0 +1,126 @@
+"""
+Offline STAC validation.
+
+pystac's default validator downloads every JSON schema it doesn't bundle over HTTP and recompiles the schema
+on each call, which is slow and fails outright on hosts without internet access. This validator only reads
+schemas from pystac's bundled copies and a local schema directory, filled with
+``python manage.py sync_stac_schemas``, and keeps one compiled validator per schema for the life of the process.
+"""
+import functools
+import json
+import os
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import jsonschema
+import pystac
+from django.conf import settings
+from pystac.validation import STACValidator, validate_dict
+from pystac.validation.local_validator import get_local_schema_cache
+from pystac.validation.schema_uri_map import DefaultSchemaUriMap
+from referencing import Registry, Resource
+from referencing.exceptions import Unresolvable
+from referencing.jsonschema import DRAFT7
+
+BUNDLED_SCHEMAS = get_local_schema_cache()
+
+
+class STACSchemaUnavailable(Exception):
+    """A schema needed for validation is not in the local schema registry."""
+
+
+def schema_dir():
+    return getattr(settings, 'HYDROLOGY_STAC_SCHEMA_DIR', os.path.join(os.path.dirname(__file__), 'stac_schemas'))
+
+
+def schema_path(uri):
+    """The local file for a schema URI, laid out as ``<schema dir>/<host>/<path>``."""
+    parts = urlsplit(uri)
+    return os.path.join(schema_dir(), parts.netloc, *parts.path.strip('/').split('/'))
+
+
+def save_schema(uri, schema):
+    path = schema_path(uri)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as schema_file:
+        json.dump(schema, schema_file)
+
+
+def schema_references(uri, schema):
+    """The absolute URIs of every other schema that ``schema`` refers to with ``$ref``."""
+    base = schema.get('$id', uri) if isinstance(schema, dict) else uri
+    references = set()
+    pending = [schema]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            if isinstance(node.get('$ref'), str):
+                reference = urldefrag(urljoin(base, node['$ref']))[0]
+                if reference and reference != uri:
+                    references.add(reference)
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+    return references
+
+
+@functools.lru_cache(maxsize=None)
+def load_schema(uri):
+    uri = urldefrag(uri)[0]
+    if uri in BUNDLED_SCHEMAS:
+        return BUNDLED_SCHEMAS[uri]
+    try:
+        with open(schema_path(uri)) as schema_file:
+            schema = json.load(schema_file)
+    except FileNotFoundError:
+        raise STACSchemaUnavailable(
+            f"The STAC schema {uri} is not available locally. Run 'manage.py sync_stac_schemas {uri}' to fetch it."
+        )
+    if not str(schema.get('$id', '')).startswith('http'):
+        schema['$id'] = uri
+    return schema
+
+
+REGISTRY = Registry(retrieve=lambda uri: Resource.from_contents(load_schema(uri), default_specification=DRAFT7))
+
+
+@functools.lru_cache(maxsize=None)
+def compiled_validator(uri):
+    schema = load_schema(uri)
+    validator_class = jsonschema.validators.validator_for(schema)
+    return validator_class(schema, registry=REGISTRY)
+
+
+class OfflineSTACValidator(STACValidator):
+    def __init__(self):
+        self.schema_uri_map = DefaultSchemaUriMap()
+
+    def _validate_from_uri(self, stac_dict, stac_object_type, schema_uri, href=None):
+        try:
+            errors = list(compiled_validator(schema_uri).iter_errors(stac_dict))
+        except Unresolvable as e:
+            raise STACSchemaUnavailable(f"A schema referenced by {schema_uri} is not available locally: {e}")
+        if errors:
+            best = jsonschema.exceptions.best_match(errors)
+            raise pystac.STACValidationError(
+                f"Validation failed for {stac_object_type} with ID {stac_dict.get('id')} "
+                f"against schema at {schema_uri}\n{best}",
+                source=errors,
+            )
+        return schema_uri
+
+    def validate_core(self, stac_dict, stac_object_type, stac_version, href=None):
+        schema_uri = self.schema_uri_map.get_object_schema_uri(stac_object_type, stac_version)
+        if schema_uri is None:
+            return None
+        return self._validate_from_uri(stac_dict, stac_object_type, schema_uri, href)
+
+    def validate_extension(self, stac_dict, stac_object_type, stac_version, extension_id, href=None):
+        return self._validate_from_uri(stac_dict, stac_object_type, extension_id, href)
+
+
+VALIDATOR = OfflineSTACValidator()
+
+
+def validate_stac(stac_dict):
+    """Validate a STAC object and its extensions without network access; raises ``STACValidationError``."""
+    return validate_dict(stac_dict, validator=VALIDATOR)
@@ -0,0 +1,74 @@
+"""
+Background chart rendering.
+
+TimeSeries rows with ``chart_status='pending'`` form the job queue, so no broker is needed: workers claim
+one row at a time with ``SELECT ... FOR UPDATE SKIP LOCKED`` and run side by side safely. A claimed row is
+marked ``rendering`` and the claim committed before the chart is drawn, so the row isn't locked while the
+chart renders and uploads. Start a worker with ``python manage.py run_chart_worker``.
+"""
+import logging
+
+from django.db import transaction
+
+from hydrology.caching import invalidate_project_cache
+from hydrology.models import TimeSeries
+
+logger = logging.getLogger(__name__)
+
+
+def claim_next_chart():
+    """Mark the oldest pending chart as rendering and return its TimeSeries, or None if the queue is empty."""
+    with transaction.atomic():
+        time_series = TimeSeries.objects.select_for_update(skip_locked=True).filter(
+            chart_status=TimeSeries.CHART_PENDING
+        ).order_by('updated_at').first()
+        if time_series is None:
+            return None
+        TimeSeries.objects.filter(pk=time_series.pk).update(chart_status=TimeSeries.CHART_RENDERING)
+    time_series.chart_status = TimeSeries.CHART_RENDERING
+    return time_series
+
+
+def render_next_chart():
+    """Render the oldest pending chart. Returns the TimeSeries handled, or None if the queue is empty."""
+    time_series = claim_next_chart()
+    if time_series is None:
+        return None
+    try:
+        time_series.create_chart(save=False)
+        chart_status = TimeSeries.CHART_READY
+    except Exception:
+        logger.exception("Chart rendering failed for time series %s", time_series.pk)
+        chart_status = TimeSeries.CHART_FAILED
+    # update() rather than save() so the worker doesn't re-queue the chart or touch updated_at. A save or
+    # append while rendering sets the chart back to pending, in which case this result is stale and dropped.
+    updated = TimeSeries.objects.filter(pk=time_series.pk, chart_status=TimeSeries.CHART_RENDERING).update(
+        chart=time_series.chart.name,
+        chart_hash=time_series.chart_hash,
+        chart_status=chart_status,
+    )
+    if updated:
+        time_series.chart_status = chart_status
+        invalidate_project_cache(time_series.project_id)
+    return time_series
+
+
+def requeue_interrupted_charts():
+    """
+    Put charts left ``rendering`` by a worker that stopped mid-render back in the queue; returns the count.
+
+    A chart another worker is still rendering may be queued again, which only costs a second render.
+    """
+    return TimeSeries.objects.filter(chart_status=TimeSeries.CHART_RENDERING).update(
+        chart_status=TimeSeries.CHART_PENDING
+    )
+
+
+def render_pending_charts(limit=None):
+    """Render pending charts until the queue is empty or ``limit`` have been handled; returns the count."""
+    rendered = 0
+    while limit is None or rendered < limit:
+        if render_next_chart() is None:
+            break
+        rendered += 1
+    return rendered
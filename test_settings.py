@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,7 +24,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'hydrology.middleware.QueryCountMiddleware',
 ]
+HYDROLOGY_QUERY_BUDGET = 10
+# The response cache needs a cache shared between processes; a fresh directory keeps runs apart
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='hydrology-cache-'),
+    }
+}
 
 ROOT_URLCONF = 'hydrology.urls'
 WSGI_APPLICATION = 'hydrology.wsgi.application'
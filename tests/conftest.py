@@ -96,3 +96,21 @@ def create_time_series(create_user, create_simple_project):
         project=project
     )
     return time_series
+
+
+@pytest.fixture
+def power_law_idf_data():
+    """
+    Build IDF data whose depths are ``scale * duration ** 0.4 * ari ** 0.2``.
+
+    Log-log interpolation reproduces a power law exactly, so interpolated depths can be checked against the formula.
+    """
+    def build(durations, aris, scale=12):
+        return {
+            'columnDefs': [{'field': 'duration'}] + [{'field': f'{ari}yrARI', 'ari': ari} for ari in aris],
+            'rowData': [
+                dict({'duration': duration}, **{f'{ari}yrARI': scale * duration ** 0.4 * ari ** 0.2 for ari in aris})
+                for duration in durations
+            ],
+        }
+    return build
@@ -0,0 +1,241 @@
+"""
+Benchmarks for the hydrology hot paths, run with pytest-benchmark.
+
+Charts and STAC files go to a local FileSystemStorage under ``tmp_path`` rather than S3, so the timings measure
+this app and not the network. The module is marked ``slow``, so it only runs when asked for. Save a baseline,
+then compare against it before deploying::
+
+    python -m pytest tests/test_benchmarks.py -m slow --benchmark-only --benchmark-autosave
+    python -m pytest tests/test_benchmarks.py -m slow --benchmark-only --benchmark-compare --benchmark-compare-fail=median:20%
+"""
+import math
+
+import numpy as np
+import pytest
+from django.contrib.gis.geos import Point
+from django.core.files.storage import FileSystemStorage
+
+from hydrology.columns import rows_to_columns
+from hydrology.models import IDFTable, TemporalPattern, TimeSeries
+
+pytestmark = pytest.mark.slow
+
+TIMESERIES_SIZES = [1_000, 10_000, 100_000]
+RECORD_COUNTS = [10, 100, 1_000]
+ARIS = [1, 2, 5, 10, 20, 50, 100]
+DURATIONS = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 270, 360, 540, 720, 1080, 1440, 2160, 2880, 4320]
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def generate_rows(size, step_seconds=60):
+    start = np.datetime64('2000-01-01T00:00:00', 's')
+    timestamps = np.datetime_as_string(start + np.arange(size) * np.timedelta64(step_seconds, 's'))
+    values = np.random.default_rng(0).gamma(0.5, 2.0, size)
+    return [{'timestamp': timestamp, 'value': value} for timestamp, value in zip(timestamps.tolist(), values.tolist())]
+
+
+def generate_idf_data(durations=DURATIONS, aris=ARIS):
+    """An IDF grid whose depths grow with duration and ARI, in the columnDefs/rowData layout of the frontend."""
+    column_defs = [{'field': 'duration', 'headerName': 'Duration (min)'}] + [
+        {'ari': ari, 'field': f'{ari}yrARI', 'headerName': f'{ari}yr ARI'} for ari in aris
+    ]
+    row_data = [
+        dict({'duration': duration}, **{f'{ari}yrARI': round(10 * duration ** 0.3 * (1 + math.log(ari)), 2) for ari in aris})
+        for duration in durations
+    ]
+    return {'columnDefs': column_defs, 'rowData': row_data}
+
+
+def generate_pattern(size):
+    """Whole-number percentages over ``size`` increments that add up to 100."""
+    percentages = np.random.default_rng(0).multinomial(100, np.full(size, 1 / size))
+    return {'rowData': [{'percentage': int(percentage)} for percentage in percentages]}
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    storage = FileSystemStorage(location=str(tmp_path), base_url='/media/')
+    for field_name in ('stac', 'chart'):
+        monkeypatch.setattr(TimeSeries._meta.get_field(field_name), 'storage', storage)
+    return storage
+
+
+@pytest.fixture
+def api_client_uncached(api_client_with_project, settings):
+    settings.CACHES = NO_CACHE
+    return api_client_with_project
+
+
+@pytest.mark.benchmark(group='timeseries-validation')
+@pytest.mark.parametrize('size', [10_000, 100_000, 1_000_000])
+def test_validate_rows(benchmark, size):
+    rows = generate_rows(size)
+    timestamps, values = benchmark(rows_to_columns, rows)
+    assert len(timestamps) == len(values) == size
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='timeseries-save')
+@pytest.mark.parametrize('size', TIMESERIES_SIZES)
+def test_timeseries_save(benchmark, local_storage, size):
+    rows = generate_rows(size)
+
+    def setup():
+        return (TimeSeries(name='benchmark', timezone='UTC', data=rows),), {}
+    benchmark.pedantic(lambda time_series: time_series.save(), setup=setup, rounds=5)
+    assert TimeSeries.objects.filter(row_count=size).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='timeseries-clean')
+@pytest.mark.parametrize('size', TIMESERIES_SIZES)
+def test_timeseries_clean_with_stac(benchmark, local_storage, size):
+    time_series = TimeSeries.objects.create(name='benchmark', timezone='UTC', data=generate_rows(size))
+    time_series.import_stac_as_table()
+
+    def setup():
+        time_series.stac_checksum = ''  # force the STAC validation that an unchanged file skips
+        return (), {}
+    benchmark.pedantic(time_series.clean, setup=setup, rounds=5)
+    assert time_series.stac_checksum
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='timeseries-chart')
+@pytest.mark.parametrize('size', TIMESERIES_SIZES)
+def test_timeseries_create_chart(benchmark, local_storage, size):
+    time_series = TimeSeries.objects.create(name='benchmark', timezone='UTC', data=generate_rows(size))
+
+    def setup():
+        if time_series.chart:
+            local_storage.delete(time_series.chart.name)  # charts are cached by content, so render from cold
+        return (), {}
+    benchmark.pedantic(time_series.create_chart, kwargs={'save': False}, setup=setup, rounds=5)
+    assert local_storage.exists(time_series.chart.name)
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='timeseries-datetimes')
+@pytest.mark.parametrize('size', TIMESERIES_SIZES)
+def test_timeseries_data_with_datetimes(benchmark, size):
+    time_series = TimeSeries.objects.create(name='benchmark', timezone='Australia/Brisbane', data=generate_rows(size))
+    time_series = TimeSeries.objects.get(pk=time_series.pk)
+    rows = benchmark(lambda: time_series.data_with_datetimes)
+    assert len(rows) == size
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='idf-design-storm')
+@pytest.mark.parametrize('increments', [10, 100, 1_000])
+def test_idf_create_timeseries(benchmark, increments):
+    idf_table = IDFTable.objects.create(name='benchmark', location_geom=Point(153.0, -27.5), data=generate_idf_data())
+    temporal_pattern = TemporalPattern.objects.create(name='benchmark', data=generate_pattern(increments))
+    time_series = benchmark(idf_table.create_timeseries, 60, '10yrARI', temporal_pattern)
+    assert time_series.row_count == increments + 1
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='idf-design-storm-ensemble')
+def test_idf_create_timeseries_batch(benchmark):
+    # A full ARR ensemble: 10 patterns x 12 durations x 7 frequencies
+    idf_table = IDFTable.objects.create(name='benchmark', location_geom=Point(153.0, -27.5), data=generate_idf_data())
+    temporal_patterns = [TemporalPattern(name=f'pattern {k}', data=generate_pattern(size)) for k, size in
+                         enumerate([10, 12, 15, 20, 24, 30, 36, 48, 60, 72])]
+    storms = benchmark.pedantic(
+        idf_table.create_timeseries_batch, args=(temporal_patterns, DURATIONS[:12]), rounds=3
+    )
+    assert len(storms) == 10 * 12 * len(ARIS)
+
+
+@pytest.mark.benchmark(group='idf-unit-conversion')
+@pytest.mark.parametrize('durations', [19, 100, 1_000])
+def test_idf_convert_units(benchmark, durations):
+    data = generate_idf_data(durations=np.geomspace(5, 4320, durations).round(2).tolist())
+
+    def setup():
+        return (IDFTable(name='benchmark', data=data, original_units=IDFTable.IN, saved_units=IDFTable.MM),), {}
+    benchmark.pedantic(lambda idf_table: idf_table.convert_units(), setup=setup, rounds=20)
+
+
+@pytest.mark.benchmark(group='idf-frequency')
+@pytest.mark.parametrize('conversion', [IDFTable.ari_from_aep, IDFTable.aep_from_ari])
+@pytest.mark.parametrize('vectorised', [False, True])
+def test_frequency_conversion(benchmark, conversion, vectorised):
+    frequencies = np.geomspace(0.1, 60, 1_000)
+    if vectorised:
+        results = benchmark(conversion, frequencies)
+    else:
+        results = benchmark(lambda: [conversion(frequency) for frequency in frequencies.tolist()])
+    assert len(results) == len(frequencies)
+
+
+@pytest.mark.benchmark(group='idf-interpolation')
+@pytest.mark.parametrize('size', [100, 10_000, 1_000_000])
+def test_idf_interpolate_depths(benchmark, size):
+    idf_table = IDFTable(name='benchmark', data=generate_idf_data())
+    rng = np.random.default_rng(0)
+    durations = rng.uniform(5, 4320, size)
+    aeps = rng.uniform(1, 60, size)
+    depths = benchmark(idf_table.interpolate_depths, durations, aeps)
+    assert depths.shape == (size,)
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='temporal-pattern-clean')
+@pytest.mark.parametrize('increments', [10, 100, 1_000])
+def test_temporal_pattern_clean(benchmark, increments):
+    temporal_pattern = TemporalPattern(name='benchmark', data=generate_pattern(increments))
+    benchmark(temporal_pattern.clean)
+
+
+RECORD_FACTORIES = {
+    'idf-table': lambda project, i: IDFTable(
+        name=f'Location {i}', location_geom=Point(153.0, -27.5), project=project, data=generate_idf_data()
+    ),
+    'temporal-pattern': lambda project, i: TemporalPattern(name=f'Pattern {i}', project=project, data=generate_pattern(24)),
+    'time-series': lambda project, i: TimeSeries(name=f'Series {i}', project=project, data=generate_rows(288)),
+}
+
+
+def create_records(endpoint, project, count):
+    factory = RECORD_FACTORIES[endpoint]
+    records = [factory(project, i) for i in range(count)]
+    return type(records[0]).objects.bulk_create(records)
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='api-list')
+@pytest.mark.parametrize('endpoint', ['idf-table', 'temporal-pattern', 'time-series'])
+@pytest.mark.parametrize('count', RECORD_COUNTS)
+def test_api_list(benchmark, api_client_uncached, create_simple_project, endpoint, count):
+    project = create_simple_project
+    create_records(endpoint, project, count)
+    url = f'/anuga/api/{project.id}/{endpoint}/'
+    response = benchmark(api_client_uncached.get, url, {'page_size': 1000})
+    assert response.status_code == 200
+    assert len(response.data['results']) == count
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='api-retrieve')
+@pytest.mark.parametrize('endpoint', ['idf-table', 'temporal-pattern', 'time-series'])
+def test_api_retrieve(benchmark, api_client_uncached, create_simple_project, endpoint):
+    project = create_simple_project
+    record, = create_records(endpoint, project, 1)
+    url = f'/anuga/api/{project.id}/{endpoint}/{record.pk}/'
+    response = benchmark(api_client_uncached.get, url)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='api-retrieve-timeseries')
+@pytest.mark.parametrize('size', TIMESERIES_SIZES)
+@pytest.mark.parametrize('cached', [False, True])
+def test_api_retrieve_timeseries(benchmark, api_client_with_project, create_simple_project, settings, size, cached):
+    if not cached:
+        settings.CACHES = NO_CACHE
+    project = create_simple_project
+    time_series = TimeSeries.objects.create(name='benchmark', timezone='UTC', project=project, data=generate_rows(size))
+    url = f'/anuga/api/{project.id}/time-series/{time_series.pk}/'
+    response = benchmark(api_client_with_project.get, url)
+    assert response.status_code == 200
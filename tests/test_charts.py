@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from hydrology.charts import ChartTemplate, bucket_extremes, render_timeseries_chart
+from hydrology.columns import regular_timestamps
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+THUMBNAIL = ChartTemplate(width=1, height=1, dpi=20)
+
+
+def resident_memory():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def series(size, seed=0):
+    return regular_timestamps(np.datetime64('2022-06-01T00:00', 'us'), 300, size), \
+        np.random.default_rng(seed).random(size)
+
+
+def render(seed, template=THUMBNAIL):
+    return render_timeseries_chart(*series(24, seed), template)
+
+
+def test_render_timeseries_chart():
+    assert render_timeseries_chart(*series(3)).startswith(PNG_SIGNATURE)
+    assert render_timeseries_chart(*series(0)).startswith(PNG_SIGNATURE)
+
+
+def test_bucket_extremes_keeps_peaks():
+    timestamps, values = series(100000)
+    values[12345] = 50.0
+    values[54321] = np.nan
+    starts, lows, highs = bucket_extremes(timestamps, values, 640)
+    assert len(starts) <= 640
+    assert starts[0] == timestamps[0]
+    assert np.nanmax(highs) == 50.0
+    assert np.nanmin(lows) == np.nanmin(values)
+    assert not np.isnan(highs).any()
+
+
+def test_large_series_renders_at_chart_width():
+    timestamps, values = series(500000)
+    assert render_timeseries_chart(timestamps, values).startswith(PNG_SIGNATURE)
+
+
+@pytest.mark.slow
+def test_concurrent_renders_do_not_interfere():
+    expected = [render(seed) for seed in range(8)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(render, range(8))) == expected
+
+
+@pytest.mark.slow
+def test_repeated_renders_keep_memory_flat():
+    for seed in range(100):  # warm up font and glyph caches
+        render(seed)
+    baseline = resident_memory()
+    for seed in range(2000):
+        render(seed)
+    assert resident_memory() - baseline < 20 * 1024 * 1024
@@ -1,6 +1,14 @@
+import datetime
+import gzip
+import json
+import numpy as np
 import pytest
+from django.contrib.gis.geos import Point
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.request import Request
 
 from gn_anuga.models import Project
+from hydrology.caching import response_cache_key
 from hydrology.models import IDFTable, TemporalPattern, TimeSeries
 
 
@@ -10,7 +18,7 @@ class TestIDFTableViewSet:
         project = Project.objects.latest('id')
         response = api_client_with_project.get(f'/anuga/api/{project.id}/idf-table/')
         assert response.status_code == 200
-        assert len(response.data) == 1  # Assuming this is the only object in the database
+        assert len(response.data['results']) == 1  # Assuming this is the only object in the database
 
     def test_create_idftable(self, api_client_with_project, create_idf_table):
         project = Project.objects.latest('id')
@@ -49,6 +57,87 @@ class TestIDFTableViewSet:
         updated_idf_table = IDFTable.objects.get(pk=idf_table.pk)
         assert updated_idf_table.name == 'Updated Location'
 
+    def test_retrieve_idftable_conditional(self, api_client_with_project, create_idf_table):
+        idf_table = create_idf_table
+        project = Project.objects.latest('id')
+        url = f'/anuga/api/{project.id}/idf-table/{idf_table.pk}/'
+        response = api_client_with_project.get(url)
+        assert response.status_code == 200
+        etag = response['ETag']
+        assert response['Last-Modified']
+
+        response = api_client_with_project.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+
+        idf_table.name = 'Renamed Location'
+        idf_table.save()
+        response = api_client_with_project.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+        assert json.loads(response.content)['name'] == 'Renamed Location'
+
+    def test_responses_not_cached_in_a_per_process_cache(self, api_client_with_project, create_idf_table, settings):
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        idf_table = create_idf_table
+        project = Project.objects.latest('id')
+        response = api_client_with_project.get(f'/anuga/api/{project.id}/idf-table/{idf_table.pk}/')
+        assert response.status_code == 200
+        assert not response.has_header('ETag')
+
+    def test_edit_converted_idftable_round_trip(self, api_client_with_project, create_simple_project):
+        project = create_simple_project
+        data = {
+            'columnDefs': [{'field': 'duration'}, {'field': '10yrARI', 'ari': 10}, {'field': '100yrARI', 'ari': 100}],
+            'rowData': [{'duration': 30, '10yrARI': 1.5, '100yrARI': 2.5}, {'duration': 60, '10yrARI': 2, '100yrARI': 3}],
+        }
+        idf_table = IDFTable.objects.create(
+            name='NOAA Location', project=project, data=data, original_units=IDFTable.IN, saved_units=IDFTable.MM
+        )
+        url = f'/anuga/api/{project.id}/idf-table/{idf_table.pk}/'
+        data = api_client_with_project.get(url).data['data']
+        assert data['rowData'][0]['10yrARI'] == pytest.approx(38.1)
+
+        data['rowData'][0]['10yrARI'] = 40
+        response = api_client_with_project.patch(url, {'data': data}, format='json')
+        assert response.status_code == 200
+        idf_table.refresh_from_db()
+        assert idf_table.depth(30, '10yrARI') == 40
+        assert idf_table.depth(30, '100yrARI') == pytest.approx(2.5 * 25.4)
+        assert idf_table.depth(60, '10yrARI') == pytest.approx(2 * 25.4)
+
+    def test_nearest_idftables(self, api_client_with_project, create_simple_project, power_law_idf_data):
+        project = create_simple_project
+        durations, aris = [10, 60, 1440], [2, 10, 100]
+        for name, lon, scale in (('Near', 153.02, 10), ('Middle', 153.2, 20), ('Far', 151.0, 30)):
+            IDFTable.objects.create(
+                name=name, location_geom=Point(lon, -27.47), project=project,
+                data=power_law_idf_data(durations, aris, scale)
+            )
+        url = f'/anuga/api/{project.id}/idf-table/nearest/'
+
+        response = api_client_with_project.get(url, {'lon': 153.0, 'lat': -27.47, 'k': 2})
+        assert response.status_code == 200
+        results = response.data['results']
+        assert [result['name'] for result in results] == ['Near', 'Middle']
+        assert results[0]['distance'] == pytest.approx(1973, rel=0.01)
+
+        response = api_client_with_project.get(url, {
+            'lon': 153.0, 'lat': -27.47, 'k': 2, 'interpolate': 'true', 'durations': '60', 'aeps': '1,50'
+        })
+        interpolated = response.data['interpolated']
+        assert interpolated['aeps'] == [1, 50]
+        weights = np.array([1 / results[0]['distance'] ** 2, 1 / results[1]['distance'] ** 2])
+        scale = (weights * [10, 20]).sum() / weights.sum()
+        ari = IDFTable.ari_from_aep(1)
+        assert interpolated['depths'][0][0] == pytest.approx(scale * 60 ** 0.4 * ari ** 0.2)
+        assert interpolated['depths'][0][1] is None  # a 50% AEP is more frequent than the 2 year ARI column
+
+        assert api_client_with_project.get(url, {'lon': 200, 'lat': 0}).status_code == 400
+        assert api_client_with_project.get(url, {'lat': 0}).status_code == 400
+        for lon in ('nan', 'inf'):
+            assert api_client_with_project.get(url, {'lon': lon, 'lat': 0}).status_code == 400
+
     def test_delete_idftable(self, api_client_with_project, create_idf_table):
         idf_table = create_idf_table
         project = Project.objects.latest('id')
@@ -63,7 +152,7 @@ class TestTemporalPatternViewSet:
         project = Project.objects.latest('id')
         response = api_client_with_project.get(f'/anuga/api/{project.id}/temporal-pattern/')
         assert response.status_code == 200
-        assert len(response.data) == 1  # Assuming this is the only object in the database
+        assert len(response.data['results']) == 1  # Assuming this is the only object in the database
 
     def test_create_temporal_pattern(self, api_client_with_project, create_temporal_pattern):
         project = Project.objects.latest('id')
@@ -106,7 +195,49 @@ class TestTimeSereiesViewSet:
         project = Project.objects.latest('id')
         response = api_client_with_project.get(f'/anuga/api/{project.id}/time-series/')
         assert response.status_code == 200
-        assert len(response.data) == 1  # Assuming this is the only object in the database
+        assert len(response.data['results']) == 1  # Assuming this is the only object in the database
+
+    def test_list_time_series_projection(self, api_client_with_project, create_time_series):
+        project = Project.objects.latest('id')
+        url = f'/anuga/api/{project.id}/time-series/'
+
+        response = api_client_with_project.get(url)
+        assert 'data' not in response.data['results'][0]
+        assert response.data['results'][0]['name'] == 'Valid Time Series'
+
+        response = api_client_with_project.get(url, {'fields': 'id,name,data'})
+        assert set(response.data['results'][0]) == {'id', 'name', 'data'}
+
+        response = api_client_with_project.get(url, {'omit': 'description,chart'})
+        assert 'description' not in response.data['results'][0]
+        assert 'chart' not in response.data['results'][0]
+
+    def test_list_time_series_cursor_pagination(self, api_client_with_project, create_time_series):
+        project = Project.objects.latest('id')
+        for index in range(2):
+            TimeSeries.objects.create(project=project, name=f'Series {index}', timezone='UTC', data=[])
+        url = f'/anuga/api/{project.id}/time-series/'
+
+        response = api_client_with_project.get(url, {'page_size': 2})
+        assert [series['name'] for series in response.data['results']] == ['Series 1', 'Series 0']
+        response = api_client_with_project.get(response.data['next'])
+        assert [series['name'] for series in response.data['results']] == ['Valid Time Series']
+        assert response.data['next'] is None
+
+    def test_filter_time_series_by_summary(self, api_client_with_project, create_time_series):
+        project = Project.objects.latest('id')
+        for peak in (50, 150):
+            TimeSeries.objects.create(project=project, name=f'Peak {peak}', timezone='UTC', data=[
+                {'timestamp': '2022-06-01T00:00:00', 'value': 1}, {'timestamp': '2022-06-01T00:05:00', 'value': peak}
+            ])
+        url = f'/anuga/api/{project.id}/time-series/'
+
+        response = api_client_with_project.get(url, {'peak__gt': 100})
+        assert [series['name'] for series in response.data['results']] == ['Peak 150']
+        response = api_client_with_project.get(url, {'depth__lte': 51, 'start_time__gte': '2022-06-01'})
+        assert [series['name'] for series in response.data['results']] == ['Peak 50']
+        response = api_client_with_project.get(url, {'peak__gt': 'high'})
+        assert response.status_code == 400
 
     def test_create_time_series(self, api_client_with_project, create_time_series):
         project = Project.objects.latest('id')
@@ -144,9 +275,177 @@ class TestTimeSereiesViewSet:
         assert updated_time_series.name == 'Updated Name'
         assert updated_time_series.data == updated_data
 
+    def test_append_time_series(self, api_client_with_project, create_time_series):
+        time_series = create_time_series
+        project = Project.objects.latest('id')
+        response = api_client_with_project.post(f'/anuga/api/{project.id}/time-series/{time_series.pk}/append/', {
+            'rowData': [
+                {'timestamp': '2022-06-01T00:00:00', 'value': 1},
+                {'timestamp': '2022-06-01T00:05:00', 'value': 2}
+            ]
+        }, format='json')
+        assert response.status_code == 200
+        assert response.data['appended'] == 2
+        updated_time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert len(updated_time_series.row_data) == 2
+
+        response = api_client_with_project.post(f'/anuga/api/{project.id}/time-series/{time_series.pk}/append/', {
+            'rowData': [{'timestamp': '2022-06-01T00:05:00', 'value': 3}]
+        }, format='json')
+        assert response.status_code == 400
+
+    def test_retrieve_time_series_window_and_resample(self, api_client_with_project, create_time_series):
+        time_series = create_time_series
+        time_series.data = {'rowData': [
+            {'timestamp': f'2022-06-01T00:{minute:02d}:00', 'value': 1} for minute in range(0, 60, 5)
+        ]}
+        time_series.save()
+        project = Project.objects.latest('id')
+        url = f'/anuga/api/{project.id}/time-series/{time_series.pk}/'
+
+        response = api_client_with_project.get(url, {'start': '2022-06-01T00:10:00', 'end': '2022-06-01T00:20:00'})
+        assert response.status_code == 200
+        assert [row['timestamp'] for row in response.data['data']['rowData']] == [
+            '2022-06-01T00:10:00', '2022-06-01T00:15:00', '2022-06-01T00:20:00'
+        ]
+
+        response = api_client_with_project.get(url, {'resample': '15min', 'agg': 'sum'})
+        assert response.status_code == 200
+        assert response.data['data']['rowData'] == [
+            {'timestamp': '2022-06-01T00:00:00', 'value': 3.0},
+            {'timestamp': '2022-06-01T00:15:00', 'value': 3.0},
+            {'timestamp': '2022-06-01T00:30:00', 'value': 3.0},
+            {'timestamp': '2022-06-01T00:45:00', 'value': 3.0}
+        ]
+
+        response = api_client_with_project.get(url, {'resample': '15min', 'agg': 'median'})
+        assert response.status_code == 400
+
+    def test_export_time_series(self, api_client_with_project, create_time_series):
+        time_series = create_time_series
+        time_series.data = {'rowData': [
+            {'timestamp': f'2022-06-01T00:{minute:02d}:00', 'value': minute} for minute in range(0, 20, 5)
+        ]}
+        time_series.save()
+        project = Project.objects.latest('id')
+        url = f'/anuga/api/{project.id}/time-series/{time_series.pk}/export/'
+
+        response = api_client_with_project.get(url, {'end': '2022-06-01T00:05:00'})
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/csv'
+        assert b''.join(response.streaming_content).decode().splitlines() == [
+            'timestamp,value', '2022-06-01T00:00:00,0.0', '2022-06-01T00:05:00,5.0'
+        ]
+
+        response = api_client_with_project.get(url, {'output': 'ndjson', 'start': '2022-06-01T00:15:00'},
+                                               HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        content = gzip.decompress(b''.join(response.streaming_content))
+        assert [json.loads(line) for line in content.splitlines()] == [
+            {'timestamp': '2022-06-01T00:15:00', 'value': 15.0}
+        ]
+        assert 'Accept-Encoding' in response['Vary']
+
+        for accept_encoding in ('gzip;q=0', 'br, *;q=0', 'gzip;q=0, *', 'identity'):
+            response = api_client_with_project.get(url, HTTP_ACCEPT_ENCODING=accept_encoding)
+            assert not response.has_header('Content-Encoding')
+        response = api_client_with_project.get(url, HTTP_ACCEPT_ENCODING='br;q=1.0, *;q=0.5')
+        assert response['Content-Encoding'] == 'gzip'
+
+        response = api_client_with_project.get(url, {'output': 'xml'})
+        assert response.status_code == 400
+
+    def test_upload_time_series_csv(self, api_client_with_project, create_time_series):
+        time_series = create_time_series
+        time_series.data = []
+        time_series.save()
+        project = Project.objects.latest('id')
+        url = f'/anuga/api/{project.id}/time-series/{time_series.pk}/upload/'
+        progress_url = f'/anuga/api/{project.id}/time-series/{time_series.pk}/upload-progress/'
+        assert api_client_with_project.get(progress_url).status_code == 404
+        rows = ''.join(f'2022-06-01T00:{minute:02d}:00,{minute}\n' for minute in range(0, 60, 5))
+
+        upload = SimpleUploadedFile('gauge.csv', f'timestamp,value\n{rows}'.encode(), content_type='text/csv')
+        response = api_client_with_project.post(url, {'file': upload}, format='multipart')
+        assert response.status_code == 200
+        assert response.data['appended'] == 12
+        time_series.refresh_from_db()
+        assert time_series.storage_format == TimeSeries.SEGMENTED
+        assert len(time_series.row_data) == 12
+        response = api_client_with_project.get(progress_url)
+        assert response.data == {'file': 'gauge.csv', 'status': 'complete', 'appended': 12}
+
+        upload = SimpleUploadedFile('gauge.csv', b'timestamp,value\n2022-06-01T01:00:00,1\n2022-06-01T01:05:00,x\n')
+        response = api_client_with_project.post(url, {'file': upload}, format='multipart')
+        assert response.status_code == 400
+        assert response.data['file'] == ['Row 3: values must be numeric.']
+        time_series.refresh_from_db()
+        assert len(time_series.row_data) == 12
+        response = api_client_with_project.get(progress_url)
+        assert response.data['status'] == 'failed'
+
+    def test_retrieve_time_series_as_msgpack(self, api_client_with_project, create_time_series):
+        msgpack = pytest.importorskip('msgpack')
+        time_series = create_time_series
+        time_series.data = [{'timestamp': '2022-06-01T00:00:00', 'value': 1}, {'timestamp': '2022-06-01T00:05:00', 'value': 2}]
+        time_series.save()
+        project = Project.objects.latest('id')
+        response = api_client_with_project.get(f'/anuga/api/{project.id}/time-series/{time_series.pk}/',
+                                               HTTP_ACCEPT='application/msgpack')
+        assert response.status_code == 200
+        columns = msgpack.unpackb(response.content)['data']['columns']
+        assert columns['value']['dtype'] == '<f8'
+        assert np.frombuffer(columns['value']['data'], dtype=columns['value']['dtype']).tolist() == [1.0, 2.0]
+        assert np.frombuffer(columns['timestamp']['data'], dtype=columns['timestamp']['dtype']).tolist() == [
+            datetime.datetime(2022, 6, 1, 0, 0), datetime.datetime(2022, 6, 1, 0, 5)
+        ]
+
+    def test_retrieve_time_series_as_arrow(self, api_client_with_project, create_time_series):
+        pyarrow = pytest.importorskip('pyarrow')
+        time_series = create_time_series
+        time_series.data = [{'timestamp': '2022-06-01T00:00:00', 'value': 1}, {'timestamp': '2022-06-01T00:05:00', 'value': 2}]
+        time_series.save()
+        project = Project.objects.latest('id')
+        response = api_client_with_project.get(f'/anuga/api/{project.id}/time-series/{time_series.pk}/',
+                                               {'start': '2022-06-01T00:05:00'},
+                                               HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+        assert response.status_code == 200
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        assert table.column('value').to_pylist() == [2.0]
+        assert json.loads(table.schema.metadata[b'hydrology'])['id'] == time_series.pk
+
+        response = api_client_with_project.get(f'/anuga/api/{project.id}/time-series/',
+                                               HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+        assert response.status_code == 406
+
+    def test_list_time_series_cache_invalidated(self, api_client_with_project, create_time_series):
+        time_series = create_time_series
+        project = Project.objects.latest('id')
+        url = f'/anuga/api/{project.id}/time-series/'
+        first = api_client_with_project.get(url)
+        assert api_client_with_project.get(url).content == first.content
+
+        time_series.append_rows([{'timestamp': '2030-01-01T00:00:00', 'value': 1}])
+        response = api_client_with_project.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == 200
+        assert response['ETag'] != first['ETag']
+
+        TimeSeries.objects.filter(pk=time_series.pk).delete()
+        assert json.loads(api_client_with_project.get(url).content)['results'] == []
+
     def test_delete_time_series(self, api_client_with_project, create_time_series):
         time_series = create_time_series
         project = Project.objects.latest('id')
         response = api_client_with_project.delete(f'/anuga/api/{project.id}/time-series/{time_series.pk}/')
         assert response.status_code == 204
         assert TimeSeries.objects.count() == 0
+
+
+def test_response_cache_key_varies_with_scheme_and_host(rf, settings):
+    settings.ALLOWED_HOSTS = ['a.example', 'b.example']
+    keys = set()
+    for host, secure in [('a.example', False), ('b.example', False), ('a.example', True)]:
+        request = Request(rf.get('/anuga/api/1/idf-table/', HTTP_HOST=host, secure=secure))
+        request.accepted_media_type = 'application/json'
+        keys.add(response_cache_key(1, 1.0, request))
+    assert len(keys) == 3
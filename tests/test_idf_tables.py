@@ -1,9 +1,10 @@
 
+import numpy as np
 import pytest
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
-from hydrology.models import IDFTable, TemporalPattern
+from hydrology.models import IDFTable, TemporalPattern, TimeSeries
 
 User = get_user_model()
 
@@ -640,6 +641,15 @@ class TestIDFTableModel:
         self.latitude = 40.0308
         self.longitude = -88.5889
 
+    def expected_frequencies(self, data, factor=1):
+        """The depth columns of ``data`` built straight from its rowData, in duration order and scaled by ``factor``."""
+        rows = sorted(data['rowData'], key=lambda row: float(row['duration']))
+        fields = [column['field'] for column in data['columnDefs'] if column['field'] != 'duration']
+        return {
+            field: [np.nan if row.get(field) in (None, '') else float(row[field]) * factor for row in rows]
+            for field in fields
+        }
+
     def test_valid_cumulative_data_in_inches(self):
         idf_table = IDFTable.objects.create(
             created_by=self.user,
@@ -647,10 +657,13 @@ class TestIDFTableModel:
             location_geom=Point(self.longitude, self.latitude),
             source='Test Source',
             description='Test note',
-            data=self.valid_data_inches
+            data=self.valid_data_inches,
+            original_units=IDFTable.IN,
         )
+        expected = self.expected_frequencies(self.valid_data_inches, factor=25.4)
+        assert list(idf_table.frequencies) == list(expected)
         for label, frequency in idf_table.frequencies.items():
-            assert frequency == self.valid_data_mm.get(label)
+            np.testing.assert_allclose(frequency, expected[label])
 
     def test_valid_cumulative_data_in_millimeters(self):
         idf_table = IDFTable.objects.create(
@@ -661,8 +674,10 @@ class TestIDFTableModel:
             description='Test note',
             data=self.valid_data_mm
         )
+        expected = self.expected_frequencies(self.valid_data_mm)
+        assert list(idf_table.frequencies) == list(expected)
         for label, frequency in idf_table.frequencies.items():
-            assert frequency == self.valid_data_mm.get(label)
+            np.testing.assert_allclose(frequency, expected[label])
 
     def test_invalid_jsonfields_different_lengths_raises_error(self):
         # Alter one of the lists to make it a different length
@@ -714,38 +729,167 @@ class TestIDFTableModel:
     def test_aep_from_ari(self, ari, expected_aep):
         assert pytest.approx(IDFTable.aep_from_ari(ari), 0.1) == expected_aep
 
-    @pytest.mark.skip
-    def test_create_timeseries_from_idftable(self):
-        expected_timeseries = [
-            {"ts": "1970-01-01T00:00:00+00:00", "value": 5.4864},
-            {"ts": "1970-01-01T00:07:30+00:00", "value": 1.09728},
-            {"ts": "1970-01-01T00:15:00+00:00", "value": 9.87552},
-            {"ts": "1970-01-01T00:22:30+00:00", "value": 18.653760000000002},
-            {"ts": "1970-01-01T00:30:00+00:00", "value": 6.0350399999999995},
-            {"ts": "1970-01-01T00:37:30+00:00", "value": 2.7432},
-            {"ts": "1970-01-01T00:45:00+00:00", "value": 6.583679999999999},
-            {"ts": "1970-01-01T00:52:30+00:00", "value": 4.38912},
-            {"ts": "1970-01-01T01:00:00+00:00", "value": 4.38912},
-        ]
+    def test_frequency_conversion_arrays(self):
+        aeps = IDFTable.aep_from_ari(np.array([1, 10, 100]))
+        assert aeps == pytest.approx([63.2, 9.52, 1.0], 0.01)
+        assert IDFTable.ari_from_aep(aeps) == pytest.approx([1, 10, 100])
+        with pytest.raises(ValidationError):
+            IDFTable.ari_from_aep([10, 101])
+
+    def test_interpolate_depths(self, power_law_idf_data):
+        durations, aris = [5, 10, 30, 60, 120, 1440], [1, 2, 5, 10, 20, 50, 100]
+        idf_table = IDFTable(name='Power law', data=power_law_idf_data(durations, aris))
+        # Log-log interpolation is exact for a power law, between and on grid lines
+        assert idf_table.interpolate_depths(25, IDFTable.aep_from_ari(75)) == pytest.approx(12 * 25 ** 0.4 * 75 ** 0.2)
+        depths = idf_table.interpolate_depths(np.array([5, 25, 1440, 2000]), IDFTable.aep_from_ari(np.array([1, 75, 100, 10])))
+        assert depths[:3] == pytest.approx([12 * 5 ** 0.4, 12 * 25 ** 0.4 * 75 ** 0.2, 12 * 1440 ** 0.4 * 100 ** 0.2])
+        assert np.isnan(depths[3])  # beyond the longest duration
+        assert idf_table.interpolate_depths([[30], [60]], [10, 1]).shape == (2, 2)
 
+    def test_idf_matrix(self):
+        idf_table = IDFTable.objects.create(
+            created_by=self.user,
+            name='Test Location',
+            location_geom=Point(self.longitude, self.latitude),
+            source='Test Source',
+            data=self.valid_data_mm
+        )
+        matrix = idf_table.idf_matrix
+        assert matrix.fields[0] == '0-5yrARI'
+        assert matrix.aris.tolist() == [0.5, 1, 2, 5, 10, 20, 50, 100, 500]
+        assert matrix.aeps[4] == pytest.approx(9.52, 0.01)
+        assert matrix.durations[:3].tolist() == [5, 10, 15]
+        assert matrix.depths.shape == (19, 9)
+        assert matrix.depths[2, 2] == 127  # stored as the string "127"
+        assert idf_table.durations_in_mins == matrix.durations.tolist()
+        assert idf_table.frequencies['10yrARI'][4] == 142.75
+        assert idf_table.depth(30, '100yrARI') == 187.96
+        assert idf_table.idf_matrix is matrix
+
+        idf_table.data['rowData'][4]['100yrARI'] = 190
+        assert idf_table.idf_matrix is matrix  # in-place edits are picked up on save
+        idf_table.save()
+        assert idf_table.depth(30, '100yrARI') == 190
+
+        idf_table.selected_frequencies = [10, 100]
+        assert list(idf_table.frequencies_filtered) == ['10yrARI', '100yrARI']
+
+    def test_create_timeseries_from_idftable(self):
         idf_table = IDFTable.objects.create(
             created_by=self.user,
             name='Test Location',
             location_geom=Point(self.longitude, self.latitude),
             source='Test Source',
             description='Test note',
-            **self.valid_data_mm
+            data=self.valid_data_mm
         )
-        duration = 60
-        frequency = 'percent_10'
-        temporal_pattern_list = [0.10, 0.02, 0.18, 0.34, 0.11, 0.05, 0.12, 0.08,]
+        percentages = [10, 2, 18, 34, 11, 5, 12, 8]
         temporal_pattern = TemporalPattern.objects.create(
-            pattern=temporal_pattern_list,
+            data={'rowData': [{'percentage': percentage} for percentage in percentages]},
             name="TestPattern",
             source="Imaginary test data"
         )
-        timeseries = idf_table.create_timeseries(duration, frequency, temporal_pattern, user=None)
-        assert timeseries.data == expected_timeseries
+        timeseries = idf_table.create_timeseries(30, '10yrARI', temporal_pattern, user=self.user)
+        assert timeseries.storage_format == timeseries.REGULAR
+        assert timeseries.step_seconds == 225
+        timestamps, values = timeseries.get_columns()
+        assert str(timestamps[-1]) == '1970-01-01T00:30:00.000000'
+        assert values.tolist() == pytest.approx([142.75 * percentage / 100 for percentage in percentages + [8]])
+
+    def test_create_timeseries_batch(self):
+        idf_table = IDFTable.objects.create(
+            created_by=self.user,
+            name='Test Location',
+            location_geom=Point(self.longitude, self.latitude),
+            source='Test Source',
+            data=self.valid_data_mm,
+            selected_durations=[30, 1440],
+            selected_frequencies=[10, 100],
+        )
+        patterns = [
+            TemporalPattern.objects.create(name=name, data={'rowData': [{'percentage': p} for p in percentages]})
+            for name, percentages in (('front', [60, 30, 10]), ('even', [25, 25, 25, 25]))
+        ]
+        storms = idf_table.create_timeseries_batch(patterns, user=self.user)
+        assert len(storms) == 8
+        assert TimeSeries.objects.filter(storage_format=TimeSeries.REGULAR).count() == 8
+
+        storm = TimeSeries.objects.get(name='Test Location - 100yrARI - 1440 minutes - front')
+        assert storm.chart_status == TimeSeries.CHART_PENDING
+        assert storm.step_seconds == 1440 * 60 / 3
+        assert storm.get_columns()[1].tolist() == pytest.approx([7.746, 3.873, 1.291, 1.291])
+        summary = [storm.start_time, storm.end_time, storm.row_count, storm.peak_value]
+        total_depth = storm.total_depth
+        storm.update_summary()
+        assert summary == [storm.start_time, storm.end_time, storm.row_count, storm.peak_value]
+        assert total_depth == pytest.approx(storm.total_depth)
+
+        with pytest.raises(ValueError):
+            idf_table.create_timeseries_batch(patterns, durations=[25])
+        with pytest.raises(ValueError):
+            idf_table.create_timeseries_batch(patterns, frequencies=['3yrARI'])
+
+    def test_convert_units_on_save(self):
+        idf_table = IDFTable.objects.create(
+            created_by=self.user,
+            name='NOAA Location',
+            location_geom=Point(self.longitude, self.latitude),
+            data=self.valid_data_inches,
+            original_units=IDFTable.IN,
+            saved_units=IDFTable.MM,
+        )
+        assert idf_table.conversion_complete
+        assert idf_table.depth(30, '10yrARI') == pytest.approx(142.75 * 25.4)
+        assert self.valid_data_inches['rowData'][4]['10yrARI'] == 142.75  # the submitted grid isn't modified
+
+        idf_table.refresh_from_db()
+        assert idf_table.data['rowData'][4]['10yrARI'] == pytest.approx(142.75 * 25.4)
+        idf_table.name = 'Renamed'
+        idf_table.save()
+        assert idf_table.depth(30, '10yrARI') == pytest.approx(142.75 * 25.4)  # converted once only
+
+    def test_edited_depths_are_kept_in_saved_units(self):
+        idf_table = IDFTable.objects.create(
+            name='NOAA Location', data=self.valid_data_inches, original_units=IDFTable.IN, saved_units=IDFTable.MM
+        )
+        idf_table = IDFTable.objects.get(pk=idf_table.pk)
+        idf_table.data['rowData'][4]['10yrARI'] = 3000  # edited in millimetres, as the table is read
+        idf_table.save()
+        assert idf_table.depth(30, '10yrARI') == 3000
+        assert idf_table.depth(30, '100yrARI') == pytest.approx(self.valid_data_inches['rowData'][4]['100yrARI'] * 25.4)
+
+        # New depths in new original units are converted
+        idf_table.data = self.valid_data_inches
+        idf_table.original_units = IDFTable.CM
+        idf_table.save()
+        idf_table.refresh_from_db()
+        assert idf_table.depth(30, '10yrARI') == pytest.approx(1427.5)
+        idf_table.save()
+        assert idf_table.depth(30, '10yrARI') == pytest.approx(1427.5)
+
+        # So are depths sent with conversion_complete cleared
+        idf_table.data = self.valid_data_inches
+        idf_table.conversion_complete = False
+        idf_table.save()
+        assert idf_table.depth(30, '10yrARI') == pytest.approx(1427.5)
+
+        # Changing saved_units converts the stored depths to them
+        idf_table.saved_units = IDFTable.CM
+        idf_table.save()
+        idf_table.refresh_from_db()
+        assert idf_table.depth(30, '10yrARI') == pytest.approx(142.75)
+
+    def test_queryset_convert_units(self):
+        tables = IDFTable.objects.bulk_create([
+            IDFTable(name='inches', data=self.valid_data_inches, original_units=IDFTable.IN, saved_units=IDFTable.MM),
+            IDFTable(name='centimetres', data=self.valid_data_mm, original_units=IDFTable.CM, saved_units=IDFTable.MM),
+            IDFTable(name='millimetres', data=self.valid_data_mm),
+        ])
+        assert IDFTable.objects.convert_units() == 2
+        assert IDFTable.objects.filter(conversion_complete=False).count() == 0
+        depths = {table.name: table.depth(30, '10yrARI') for table in IDFTable.objects.filter(pk__in=[t.pk for t in tables])}
+        assert depths == pytest.approx({'inches': 142.75 * 25.4, 'centimetres': 1427.5, 'millimetres': 142.75})
+        assert IDFTable.objects.convert_units() == 0
 
     def test_selected_frequencies_and_durations(self):
         pass
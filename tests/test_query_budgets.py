@@ -0,0 +1,71 @@
+import pytest
+from django.contrib.gis.geos import Point
+
+from hydrology.models import IDFTable, TemporalPattern, TimeSeries
+
+# The most queries each endpoint may make, however many records the project holds
+LIST_BUDGET = 3
+RETRIEVE_BUDGET = 3
+CREATE_BUDGET = 8
+
+
+def idf_table(project, user, i):
+    return IDFTable.objects.create(
+        name=f'Location {i}', location_geom=Point(30, 150), source='Test Source', project=project,
+        created_by=user, owner=user, updated_by=user, data={'columnDefs': [], 'rowData': []}
+    )
+
+
+def temporal_pattern(project, user, i):
+    return TemporalPattern.objects.create(
+        name=f'Pattern {i}', source='Test Source', project=project, created_by=user, owner=user, updated_by=user,
+        data={'rowData': [{'percentage': 40}, {'percentage': 60}]}
+    )
+
+
+def time_series(project, user, i):
+    return TimeSeries.objects.create(
+        name=f'Series {i}', source='Test Source', project=project, created_by=user, owner=user, updated_by=user,
+        data={'columnDefs': [], 'rowData': [{'timestamp': '2022-06-01T00:00:00', 'value': i}]}
+    )
+
+
+ENDPOINTS = [
+    ('idf-table', idf_table, {'name': 'New Location', 'source': 'Test Data', 'location_geom': {
+        'type': 'Point', 'coordinates': [-105.01621, 39.57422]}, 'data': {'columnDefs': [], 'rowData': []}}),
+    ('temporal-pattern', temporal_pattern, {'name': 'New Pattern', 'source': 'Test Data'}),
+    ('time-series', time_series, {'name': 'New Series', 'source': 'Test Data', 'data': {'columnDefs': [], 'rowData': []}}),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('endpoint, factory, payload', ENDPOINTS)
+class TestQueryBudgets:
+    def test_list(self, api_client_with_project, create_simple_project, django_assert_max_num_queries,
+                  endpoint, factory, payload):
+        project = create_simple_project
+        url = f'/anuga/api/{project.id}/{endpoint}/'
+        counts = []
+        for size in (1, 25):
+            for i in range(size):
+                factory(project, project.owner, i)
+            with django_assert_max_num_queries(LIST_BUDGET):
+                response = api_client_with_project.get(url)
+            assert response.status_code == 200
+            counts.append(int(response['X-Query-Count']))
+        assert counts[0] == counts[1]
+
+    def test_retrieve(self, api_client_with_project, create_simple_project, django_assert_max_num_queries,
+                      endpoint, factory, payload):
+        project = create_simple_project
+        record = factory(project, project.owner, 0)
+        with django_assert_max_num_queries(RETRIEVE_BUDGET):
+            response = api_client_with_project.get(f'/anuga/api/{project.id}/{endpoint}/{record.pk}/')
+        assert response.status_code == 200
+
+    def test_create(self, api_client_with_project, create_simple_project, django_assert_max_num_queries,
+                    endpoint, factory, payload):
+        project = create_simple_project
+        with django_assert_max_num_queries(CREATE_BUDGET):
+            response = api_client_with_project.post(f'/anuga/api/{project.id}/{endpoint}/', payload, format='json')
+        assert response.status_code == 201
@@ -0,0 +1,32 @@
+import pystac
+import pytest
+
+from hydrology.stac import STACSchemaUnavailable, save_schema, validate_stac
+
+CATALOG = {'type': 'Catalog', 'id': 'catalog', 'stac_version': '1.0.0', 'description': 'desc', 'links': []}
+EXTENSION = 'https://example.com/hydrology-test/v1.0.0/schema.json'
+
+
+def test_validate_bundled_schema():
+    assert validate_stac(CATALOG) == ['https://schemas.stacspec.org/v1.0.0/catalog-spec/json-schema/catalog.json']
+
+    invalid = dict(CATALOG)
+    del invalid['description']
+    with pytest.raises(pystac.STACValidationError):
+        validate_stac(invalid)
+
+
+def test_validate_extension_from_local_registry(settings, tmp_path):
+    settings.HYDROLOGY_STAC_SCHEMA_DIR = str(tmp_path)
+    catalog = dict(CATALOG, stac_extensions=[EXTENSION])
+    with pytest.raises(STACSchemaUnavailable):
+        validate_stac(catalog)
+
+    save_schema(EXTENSION, {
+        '$schema': 'http://json-schema.org/draft-07/schema#',
+        'type': 'object',
+        'required': ['test:unit'],
+    })
+    with pytest.raises(pystac.STACValidationError):
+        validate_stac(catalog)
+    assert EXTENSION in validate_stac(dict(catalog, **{'test:unit': 'mm'}))
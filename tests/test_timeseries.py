@@ -1,4 +1,8 @@
 import datetime
+import io
+import json
+import numpy as np
+import posixpath
 import pytest
 import pytz
 import tempfile
@@ -6,7 +10,11 @@ import tempfile
 from PIL import Image
 from django.core.exceptions import ValidationError
 from django.conf import settings
-from hydrology.models import TimeSeries
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from hydrology.columns import columns_to_ndjson, parse_timestamps, parse_values, regular_timestamps, resample_columns
+from hydrology.models import TimeSeries, TimeSeriesSegment
+from hydrology.tasks import render_pending_charts
 
 
 @pytest.mark.django_db
@@ -32,6 +40,12 @@ class TestTimeSeriesModel:
             data=self.valid_time_data
         )
         assert time_series.data
+        assert time_series.chart_status == TimeSeries.CHART_PENDING
+        assert not time_series.chart
+
+        assert render_pending_charts() == 1
+        time_series.refresh_from_db()
+        assert time_series.chart_status == TimeSeries.CHART_READY
         with tempfile.NamedTemporaryFile() as chart_file:
             s3.download_file(settings.ANUGA_S3_DATA_BUCKET_NAME, f"{time_series.chart}", chart_file.name)
             with Image.open(chart_file.name) as img:
@@ -67,3 +81,391 @@ class TestTimeSeriesModel:
             {'ts': datetime.datetime(2022, 8, 1, 0, 0, tzinfo=pytz.UTC), 'value': 30}
         ]
         assert time_series.data_with_datetimes == expected_data
+
+    def test_time_series_columnar_storage(self):
+        rows = [
+            {'timestamp': '2022-06-01T00:00:00', 'value': 10.0},
+            {'timestamp': '2022-06-01T00:05:00', 'value': 2.5},
+            {'timestamp': '2022-06-01T00:10:00', 'value': 0.0}
+        ]
+        time_series = TimeSeries.objects.create(
+            name='valid TimeSeries Name',
+            timezone='UTC',
+            storage_format=TimeSeries.COLUMNAR,
+            data={'columnDefs': [], 'rowData': rows}
+        )
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.data == {'columnDefs': []}
+        assert time_series.row_data == rows
+        assert time_series.data_with_datetimes[1] == {
+            'timestamp': datetime.datetime(2022, 6, 1, 0, 5, tzinfo=pytz.UTC),
+            'value': 2.5
+        }
+
+    def test_rows_edited_in_place_are_revalidated(self):
+        time_series = TimeSeries(name='edited', timezone='UTC', storage_format=TimeSeries.COLUMNAR, data={'rowData': [
+            {'timestamp': '2022-06-01T00:00:00', 'value': 10.0},
+            {'timestamp': '2022-06-01T00:05:00', 'value': 2.5},
+        ]})
+        time_series.get_columns()
+        time_series.data['rowData'][0]['timestamp'] = 'bad'
+        with pytest.raises(ValidationError):
+            time_series.save()
+
+    def test_time_series_regular_storage(self):
+        time_series = TimeSeries(name='valid TimeSeries Name', timezone='UTC', data=dict())
+        time_series.set_regular(datetime.datetime(2022, 6, 1, tzinfo=pytz.UTC), 300, [10.0, 2.5, 0.0])
+        time_series.save()
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.step_seconds == 300
+        assert time_series.row_data == [
+            {'timestamp': '2022-06-01T00:00:00', 'value': 10.0},
+            {'timestamp': '2022-06-01T00:05:00', 'value': 2.5},
+            {'timestamp': '2022-06-01T00:10:00', 'value': 0.0}
+        ]
+
+    def test_time_series_compact_regular(self):
+        time_series = TimeSeries.objects.create(
+            name='valid TimeSeries Name',
+            timezone='UTC',
+            data={'columnDefs': [], 'rowData': [
+                {'timestamp': '2022-06-01T00:00:00', 'value': 1},
+                {'timestamp': '2022-06-01T00:01:00', 'value': 2},
+                {'timestamp': '2022-06-01T00:02:00', 'value': 3}
+            ]}
+        )
+        assert time_series.compact_regular()
+        assert time_series.storage_format == TimeSeries.REGULAR
+        assert time_series.step_seconds == 60
+        assert time_series.data == {'columnDefs': []}
+        assert list(time_series.get_columns()[1]) == [1, 2, 3]
+
+    def test_time_series_regular_rejects_irregular_rows(self):
+        with pytest.raises(ValidationError):
+            TimeSeries.objects.create(
+                name='valid TimeSeries Name',
+                timezone='UTC',
+                storage_format=TimeSeries.REGULAR,
+                data={'rowData': [
+                    {'timestamp': '2022-06-01T00:00:00', 'value': 1},
+                    {'timestamp': '2022-06-01T00:01:00', 'value': 2},
+                    {'timestamp': '2022-06-01T00:05:00', 'value': 3}
+                ]}
+            )
+
+    def test_time_series_validation_reports_every_bad_row(self):
+        with pytest.raises(ValidationError) as error:
+            TimeSeries.objects.create(
+                name='valid TimeSeries Name',
+                timezone='UTC',
+                data={'rowData': [
+                    {'timestamp': '2022-06-01T00:00:00Z', 'value': 1},
+                    {'timestamp': 'not a timestamp', 'value': 2},
+                    {'timestamp': '2022-06-01T00:00:00+00:00', 'value': 3},
+                    {'timestamp': '2022-05-01T00:00:00', 'value': 4},
+                    {'timestamp': None, 'value': 5}
+                ]}
+            )
+        assert error.value.messages == [
+            'Rows 1, 4: timestamps must be in ISO 8601 format.',
+            'Row 2: duplicate timestamps.',
+            'Row 3: timestamps must be in increasing order.'
+        ]
+
+    @pytest.mark.parametrize('storage_format', [TimeSeries.JSON, TimeSeries.COLUMNAR, TimeSeries.REGULAR])
+    def test_time_series_append_rows(self, storage_format):
+        time_series = TimeSeries.objects.create(
+            name='valid TimeSeries Name',
+            timezone='UTC',
+            storage_format=storage_format,
+            data={'columnDefs': [], 'rowData': [
+                {'timestamp': '2022-06-01T00:00:00', 'value': 1},
+                {'timestamp': '2022-06-01T00:01:00', 'value': 2}
+            ]}
+        )
+        appended = time_series.append_rows([
+            {'timestamp': '2022-06-01T00:02:00', 'value': 3},
+            {'timestamp': '2022-06-01T00:03:00', 'value': 4}
+        ])
+        assert appended == 2
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.end_time == datetime.datetime(2022, 6, 1, 0, 3, tzinfo=pytz.UTC)
+        assert list(time_series.get_columns()[1]) == [1, 2, 3, 4]
+
+    def test_time_series_append_irregular_rows_to_empty_regular_series(self):
+        time_series = TimeSeries.objects.create(
+            name='valid TimeSeries Name', timezone='UTC', storage_format=TimeSeries.REGULAR, data=[]
+        )
+        with pytest.raises(ValidationError):
+            time_series.append_rows([
+                {'timestamp': '2022-06-01T00:00:00', 'value': 1},
+                {'timestamp': '2022-06-01T00:01:00', 'value': 2},
+                {'timestamp': '2022-06-01T00:05:00', 'value': 3}
+            ])
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.row_count == 0
+        assert not len(time_series.get_columns()[0])
+
+    def test_time_series_append_rows_before_end_time(self):
+        time_series = TimeSeries.objects.create(
+            name='valid TimeSeries Name',
+            timezone='UTC',
+            data={'rowData': [{'timestamp': '2022-06-01T00:00:00', 'value': 1}]}
+        )
+        with pytest.raises(ValidationError):
+            time_series.append_rows([{'timestamp': '2022-06-01T00:00:00', 'value': 3}])
+
+    def test_timezone_change_keeps_regular_wall_clock_times(self):
+        rows = [{'timestamp': f'2022-06-01T00:0{minute}:00', 'value': minute} for minute in range(3)]
+        time_series = TimeSeries.objects.create(
+            name='regular', timezone='UTC', storage_format=TimeSeries.REGULAR, data={'rowData': rows}
+        )
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        time_series.timezone = 'Australia/Brisbane'
+        time_series.save()
+
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.row_data == [{'timestamp': row['timestamp'], 'value': float(row['value'])} for row in rows]
+        assert time_series.start_time == pytz.timezone('Australia/Brisbane').localize(datetime.datetime(2022, 6, 1))
+
+    def test_timezone_change_keeps_segment_wall_clock_times(self, monkeypatch):
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_SIZE', 2)
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_THRESHOLD', 4)
+        rows = [{'timestamp': f'2022-06-01T00:0{minute}:00', 'value': minute} for minute in range(5)]
+        time_series = TimeSeries.objects.create(name='segmented', timezone='UTC', data={'rowData': rows})
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        time_series.timezone = 'Australia/Brisbane'
+        time_series.save()
+
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        timestamps, values = time_series.get_columns_between(
+            datetime.datetime(2022, 6, 1, 0, 1), datetime.datetime(2022, 6, 1, 0, 2)
+        )
+        assert list(values) == [1, 2]
+        assert time_series.end_time == pytz.timezone('Australia/Brisbane').localize(datetime.datetime(2022, 6, 1, 0, 4))
+
+    def test_compact_timeseries_command_drops_segments(self, monkeypatch):
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_SIZE', 2)
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_THRESHOLD', 4)
+        rows = [{'timestamp': f'2022-06-01T00:0{minute}:00', 'value': minute} for minute in range(5)]
+        time_series = TimeSeries.objects.create(name='valid TimeSeries Name', timezone='UTC', data={'rowData': rows})
+        assert time_series.segments.count() == 3
+
+        call_command('compact_timeseries', stdout=io.StringIO())
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.storage_format == TimeSeries.REGULAR
+        assert not TimeSeriesSegment.objects.filter(timeseries_id=time_series.pk).exists()
+        assert list(time_series.get_columns()[1]) == [0, 1, 2, 3, 4]
+
+    def test_time_series_long_series_moves_to_segments(self, monkeypatch):
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_SIZE', 2)
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_THRESHOLD', 4)
+        rows = [{'timestamp': f'2022-06-01T00:0{minute}:00', 'value': minute} for minute in range(5)]
+        time_series = TimeSeries.objects.create(name='valid TimeSeries Name', timezone='UTC', data={'rowData': rows})
+        assert time_series.storage_format == TimeSeries.SEGMENTED
+        assert time_series.segments.count() == 3
+
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.row_data == [{'timestamp': row['timestamp'], 'value': float(row['value'])} for row in rows]
+        timestamps, values = time_series.get_columns_between(
+            datetime.datetime(2022, 6, 1, 0, 1), datetime.datetime(2022, 6, 1, 0, 2)
+        )
+        assert list(values) == [1, 2]
+
+        time_series.append_rows([{'timestamp': '2022-06-01T00:05:00', 'value': 5}])
+        assert time_series.segments.count() == 3
+        assert list(time_series.get_columns()[1]) == [0, 1, 2, 3, 4, 5]
+
+    def test_failed_chart_render_is_recorded(self, monkeypatch):
+        time_series = TimeSeries.objects.create(name='broken chart', timezone='UTC', data=self.valid_time_data)
+
+        def broken_chart(self, save=True):
+            raise RuntimeError("renderer unavailable")
+        monkeypatch.setattr(TimeSeries, 'create_chart', broken_chart)
+
+        assert render_pending_charts() == 1
+        time_series.refresh_from_db()
+        assert time_series.chart_status == TimeSeries.CHART_FAILED
+        assert render_pending_charts() == 0
+
+    def test_chart_is_rendered_without_holding_the_row_lock(self, monkeypatch):
+        time_series = TimeSeries.objects.create(name='edited while rendering', timezone='UTC', data=self.valid_time_data)
+
+        def chart_edited_meanwhile(self, save=True):
+            assert TimeSeries.objects.get(pk=self.pk).chart_status == TimeSeries.CHART_RENDERING
+            TimeSeries.objects.get(pk=self.pk).append_rows([{'ts': '2022-09-01T00:00:00', 'value': 40}])
+            self.chart_hash = 'stale'
+        monkeypatch.setattr(TimeSeries, 'create_chart', chart_edited_meanwhile)
+
+        assert render_pending_charts(limit=1) == 1
+        time_series.refresh_from_db()
+        assert time_series.chart_status == TimeSeries.CHART_PENDING
+        assert time_series.chart_hash != 'stale'
+
+    def test_chart_is_cached_by_content(self, s3):
+        first = TimeSeries.objects.create(name='first', timezone='UTC', data=self.valid_time_data)
+        second = TimeSeries.objects.create(name='second', timezone='UTC', data=self.valid_time_data)
+        assert render_pending_charts() == 2
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert first.chart_hash == second.chart_hash
+        assert first.chart.name == second.chart.name == f'timeseries/chart/{first.chart_hash}.png'
+
+        first.name = 'renamed'
+        first.save()
+        assert first.chart_status == TimeSeries.CHART_READY
+        assert render_pending_charts() == 0
+
+        first.data = self.valid_time_data[:2]
+        first.save()
+        assert first.chart_status == TimeSeries.CHART_PENDING
+
+    def test_import_stac_as_table(self, s3):
+        time_series = TimeSeries.objects.create(name='stac table', timezone='UTC', data=self.valid_time_data)
+        time_series.import_stac_as_table()
+
+        time_series.refresh_from_db()
+        catalog = json.loads(time_series.stac.read())
+        collection_href = next(link['href'] for link in catalog['links'] if link['rel'] == 'child')
+        stac_root = posixpath.dirname(time_series.stac.name)
+        collection_path = posixpath.normpath(posixpath.join(stac_root, collection_href))
+        with time_series.stac.storage.open(collection_path) as collection_file:
+            collection = json.load(collection_file)
+        assert collection['extent']['temporal']['interval'] == [['2022-06-01T00:00:00Z', '2022-08-01T00:00:00Z']]
+
+        item_href = next(link['href'] for link in collection['links'] if link['rel'] == 'item')
+        item_path = posixpath.normpath(posixpath.join(posixpath.dirname(collection_path), item_href))
+        with time_series.stac.storage.open(item_path) as item_file:
+            item = json.load(item_file)
+        assert item['properties']['row_count'] == 3
+        table_path = posixpath.join(posixpath.dirname(item_path), item['assets']['data']['href'])
+        with time_series.stac.storage.open(posixpath.normpath(table_path)) as table_file:
+            assert table_file.read().decode().splitlines() == [
+                'timestamp,value',
+                '2022-06-01T00:00:00,10.0',
+                '2022-07-01T00:00:00,20.0',
+                '2022-08-01T00:00:00,30.0',
+            ]
+
+    def test_import_stac_as_table_fails_if_storage_renames_a_file(self, tmp_path, monkeypatch):
+        storage = FileSystemStorage(location=str(tmp_path))
+        monkeypatch.setattr(TimeSeries._meta.get_field('stac'), 'storage', storage)
+        monkeypatch.setattr(storage, 'get_available_name', lambda name, max_length=None: f'{name}.1')
+        time_series = TimeSeries.objects.create(name='stac collision', timezone='UTC', data=self.valid_time_data)
+        with pytest.raises(ValueError):
+            time_series.import_stac_as_table()
+        assert not [path for path in tmp_path.rglob('*') if path.is_file()]
+
+    def test_unchanged_stac_is_not_revalidated(self, s3, monkeypatch):
+        time_series = TimeSeries.objects.create(name='stac checksum', timezone='UTC', data=self.valid_time_data)
+        time_series.import_stac_as_table()
+        assert time_series.stac_checksum
+
+        def fail_validation(stac_dict):
+            raise AssertionError("unchanged STAC was validated again")
+        monkeypatch.setattr('hydrology.models.validate_stac', fail_validation)
+        time_series.description = 'only the description changed'
+        time_series.save()
+
+    @pytest.mark.parametrize('data', [[], {'columnDefs': [], 'rowData': []}])
+    def test_append_csv_in_chunks(self, data):
+        time_series = TimeSeries.objects.create(name='csv upload', timezone='UTC', data=data)
+        lines = ['ts,value\n'] + [f'2022-06-01T00:{minute:02d}:00,{minute}\n' for minute in range(10)]
+        progress = []
+
+        assert time_series.append_csv(lines, chunk_size=3, progress=progress.append) == 10
+        assert progress == [3, 6, 9, 10]
+        time_series.refresh_from_db()
+        assert time_series.stored_format == TimeSeries.SEGMENTED
+        assert time_series.row_data[-1] == {'timestamp': '2022-06-01T00:09:00', 'value': 9.0}
+        assert len(time_series.get_columns()[0]) == 10
+
+        with pytest.raises(ValidationError):
+            time_series.append_csv(['ts,value\n', '2022-06-01T00:05:00,1\n'])
+
+    @pytest.mark.parametrize('storage_format', [TimeSeries.JSON, TimeSeries.COLUMNAR, TimeSeries.REGULAR])
+    def test_append_csv_moves_series_to_segments(self, storage_format):
+        rows = [{'timestamp': f'2022-06-01T00:0{minute}:00', 'value': minute} for minute in range(3)]
+        time_series = TimeSeries.objects.create(
+            name='csv upload', timezone='UTC', storage_format=storage_format, data={'rowData': rows}
+        )
+        lines = ['timestamp,value\n'] + [f'2022-06-01T00:0{minute}:00,{minute}\n' for minute in range(3, 6)]
+        assert time_series.append_csv(lines, chunk_size=2) == 3
+
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.storage_format == TimeSeries.SEGMENTED
+        assert time_series.data_binary is None
+        assert time_series.segments.exists()
+        assert time_series.get_columns()[1].tolist() == [0, 1, 2, 3, 4, 5]
+
+    def test_append_rows_past_threshold_moves_to_segments(self, monkeypatch):
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_SIZE', 2)
+        monkeypatch.setattr(TimeSeries, 'SEGMENT_THRESHOLD', 4)
+        rows = [{'timestamp': f'2022-06-01T00:0{minute}:00', 'value': minute} for minute in range(3)]
+        time_series = TimeSeries.objects.create(name='append', timezone='UTC', data={'rowData': rows})
+        time_series.append_rows([{'timestamp': '2022-06-01T00:03:00', 'value': 3}])
+        assert TimeSeries.objects.get(pk=time_series.pk).storage_format == TimeSeries.JSON
+
+        time_series.append_rows([{'timestamp': '2022-06-01T00:04:00', 'value': 4}])
+        time_series = TimeSeries.objects.get(pk=time_series.pk)
+        assert time_series.storage_format == TimeSeries.SEGMENTED
+        assert time_series.segments.count() == 3
+        assert time_series.row_count == 5
+        assert time_series.get_columns()[1].tolist() == [0, 1, 2, 3, 4]
+
+    @pytest.mark.parametrize('storage_format', [TimeSeries.JSON, TimeSeries.COLUMNAR, TimeSeries.SEGMENTED])
+    def test_summary_columns(self, storage_format):
+        time_series = TimeSeries.objects.create(
+            name='summary', timezone='UTC', storage_format=storage_format, data=[
+                {'timestamp': '2022-06-01T00:00:00', 'value': 4},
+                {'timestamp': '2022-06-01T00:05:00', 'value': 10},
+            ]
+        )
+        assert time_series.row_count == 2
+        assert time_series.total_depth == 14.0
+        assert time_series.peak_value == 10.0
+        assert time_series.step_seconds == 300
+        assert time_series.start_time == datetime.datetime(2022, 6, 1, tzinfo=pytz.UTC)
+
+        time_series.append_rows([{'timestamp': '2022-06-01T00:20:00', 'value': 1}])
+        time_series.refresh_from_db()
+        assert time_series.row_count == 3
+        assert time_series.total_depth == 15.0
+        assert time_series.peak_value == 10.0
+        assert time_series.step_seconds is None
+        assert time_series.end_time == datetime.datetime(2022, 6, 1, 0, 20, tzinfo=pytz.UTC)
+
+
+@pytest.mark.parametrize('timestamp', ['now', 'today', '2022', '2022-06', '2022-06-01T10:00:00-06', '2022-06-01T10:00:00 '])
+def test_parse_timestamps_rejects_non_iso_strings(timestamp):
+    timestamps, bad_indices = parse_timestamps(['2022-06-01T00:00:00', timestamp])
+    assert bad_indices.tolist() == [1]
+
+
+def test_parse_timestamps_drops_both_offset_forms():
+    timestamps, bad_indices = parse_timestamps(['2022-06-01T10:00:00+10:00', '2022-06-01T11:00:00+1000', '2022-06-01T12:00:00Z'])
+    assert not len(bad_indices)
+    assert timestamps.astype(str).tolist() == [
+        '2022-06-01T10:00:00.000000', '2022-06-01T11:00:00.000000', '2022-06-01T12:00:00.000000'
+    ]
+
+
+def test_parse_values_rejects_missing_and_non_finite_values():
+    values, bad_indices = parse_values([1.0, None, float('inf'), 'nan', '2'])
+    assert bad_indices.tolist() == [1, 2, 3]
+    assert values[0] == 1.0 and values[4] == 2.0
+
+
+@pytest.mark.parametrize('agg', ['mean', 'sum', 'max', 'min'])
+def test_resample_omits_bins_without_numbers(agg):
+    timestamps = regular_timestamps(np.datetime64('2022-06-01T00:00', 'us'), 300, 6)
+    values = np.array([1.0, 3.0, np.nan, np.nan, 5.0, np.nan])
+    labels, resampled = resample_columns(timestamps, values, np.timedelta64(10, 'm'), agg)
+    assert labels.astype(str).tolist() == ['2022-06-01T00:00:00.000000', '2022-06-01T00:20:00.000000']
+    assert not np.isnan(resampled).any()
+
+
+def test_ndjson_writes_non_finite_values_as_null():
+    timestamps = regular_timestamps(np.datetime64('2022-06-01T00:00', 'us'), 300, 4)
+    lines = columns_to_ndjson(timestamps, np.array([1.0, np.nan, np.inf, -np.inf])).decode().splitlines()
+    assert [json.loads(line)['value'] for line in lines] == [1.0, None, None, None]